@@ -0,0 +1,86 @@
+"""
+action_schema.py
+
+Single registry of the actions Timmy can take.
+The same table renders the AVAILABLE ACTIONS list in the system prompt and
+builds the JSON schema Brain hands to Ollama's structured outputs, so the
+prompt and the constrained decoder can never drift apart.
+"""
+
+import json
+from typing import Dict, Any, List
+
+# Action name -> example params. Example values double as type hints.
+ACTION_EXAMPLES: Dict[str, Dict[str, Any]] = {
+    "shell": {"command": "any terminal command"},
+    "create_file": {"path": "/full/path/file.txt", "content": "content"},
+    "create_dir": {"path": "/full/path/dir"},
+    "read_file": {"path": "/full/path/file"},
+    "list_dir": {"path": "/full/path/dir"},
+    "delete": {"path": "/full/path", "recursive": False},
+    "search_web": {"query": "search terms"},
+    "deep_search": {"query": "search terms"},
+    "open_app": {"app_name": "AppName"},
+    "close_app": {"app_name": "AppName"},
+    "open_url": {"url": "https://..."},
+    "learn_youtube": {"url": "https://youtube.com/watch?v=..."},
+    "learn_webpage": {"url": "https://..."},
+    "convene_council": {"problem": "describe the complex problem"},
+    "plan": {"steps": ["step 1", "step 2", "step 3"]},
+    "notes_create": {"title": "Note Title", "body": "Note content"},
+    "forge_skill": {"name": "SkillName", "description": "What it does", "commands": ["cmd1", "cmd2"]},
+    "use_skill": {"name": "SkillName"},
+    "send_email": {"to": "email@example.com", "subject": "Subject", "body": "Body"},
+    "summarize_emails": {},
+    "analyze_browser_tab": {"prompt": "What do you see?"},
+    "read_blob": {"handle": "blob:...", "start_line": 1, "end_line": 200},
+    "batch": {"actions": [{"action": "read_file", "params": {"path": "/a"}},
+                          {"action": "search_web", "params": {"query": "x"}}]},
+}
+
+
+def format_action_list() -> str:
+    """The AVAILABLE ACTIONS lines for the system prompt."""
+    return "\n".join(f"- {json.dumps({'action': name, 'params': params})}" for name, params in ACTION_EXAMPLES.items())
+
+
+def _value_schema(example: Any) -> Dict[str, Any]:
+    if isinstance(example, bool):
+        return {"type": "boolean"}
+    if isinstance(example, (int, float)):
+        return {"type": "number"}
+    if isinstance(example, list):
+        return {"type": "array", "items": _value_schema(example[0]) if example else {}}
+    if isinstance(example, dict):
+        return {"type": "object"}
+    return {"type": "string"}
+
+
+def _params_schema(name: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    if name == "batch":
+        inner = [n for n in ACTION_EXAMPLES if n != "batch"]
+        item = {"type": "object",
+                "properties": {"action": {"type": "string", "enum": inner}, "params": {"type": "object"}},
+                "required": ["action", "params"]}
+        return {"type": "object", "properties": {"actions": {"type": "array", "items": item}}, "required": ["actions"]}
+    return {
+        "type": "object",
+        "properties": {key: _value_schema(value) for key, value in params.items()},
+        # Flags and numbers (`recursive`, line ranges) are optional; everything else is required
+        "required": [key for key, value in params.items() if not isinstance(value, (bool, int, float))],
+    }
+
+
+def build_action_schema(names: List[str] = None) -> Dict[str, Any]:
+    """JSON schema for one action object, one branch per registered action."""
+    names = names or list(ACTION_EXAMPLES)
+    return {
+        "anyOf": [
+            {
+                "type": "object",
+                "properties": {"action": {"const": name}, "params": _params_schema(name, ACTION_EXAMPLES[name])},
+                "required": ["action", "params"],
+            }
+            for name in names
+        ]
+    }
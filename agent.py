@@ -15,16 +15,27 @@ import sqlite3
 import os
 import asyncio
 import random
-from typing import Dict, Any, List, Generator, Optional
+import threading
+import time
+from typing import Dict, Any, List, Generator, AsyncGenerator, Optional
 
 from brain import Brain
 from council import Council
 from memory import Memory
 from loop_detector import LoopDetector
+from stream_parser import StreamParser
+from prompt_builder import PromptBuilder
+from context_packer import ContextPacker, estimate_tokens
+from conversation_store import ConversationStore
+from cancellation import CancelToken, is_cancelled
+from action_schema import format_action_list, build_action_schema
+from query_router import QueryRouter, observed_route, CODE_EXTENSIONS
+from model_router import ModelRouter
+from blob_store import BlobStore, BLOB_TEXT_FIELDS
 from tools import ALL_TOOLS, Tool
 from skills import ALL_SKILLS, Skill, CodeWriterSkill
 from learning import YouTubeLearner, WebScraper
-from config import PROJECT_ROOT, DATA_PATH, TIMS_STUFF_PATH
+from config import PROJECT_ROOT, DATA_PATH, TIMS_STUFF_PATH, CONTEXT_HISTORY_LIMIT, STRUCTURED_ACTION_REPAIR, FAST_PATH_MODEL, BLOB_INLINE_LIMIT, BLOB_PREVIEW_CHARS
 from vibe_system import VibeSystem
 from skill_forge import SkillForge
 from subconscious import Subconscious
@@ -64,26 +75,7 @@ memory_palace = MemoryPalace()
 project_generator = ProjectGenerator()
 crypto_wallet = CryptoWallet()
 
-def get_system_prompt(agent):
-    """Generate system prompt with current date and all 30 upgrades."""
-    today = datetime.date.today().strftime("%B %d, %Y")
-    year = datetime.date.today().year
-    
-    vibe_snippet = vibe_system.get_vibe_prompt_snippet()
-    learned_skills_snippet = skill_forge.get_skill_list()
-    calendar_snippet = calendar_manager.get_calendar_summary()
-    memory_palace_snippet = memory_palace.get_palace_summary()
-    synapse_snippet = agent.synapse_engine.get_synapse_context()
-    observer_snippet = agent.world_observer.get_observer_context()
-    kernel_snippet = agent.omni_kernel.get_kernel_status()
-    eye_snippet = agent.ghost_eye.get_eye_context()
-    file_eye_snippet = agent.file_eye.get_eye_context()
-    comfy_snippet = agent.comfy_controller.get_controller_context()
-    evolution_snippet = agent.evolution_engine.get_evolution_context()
-    dream_snippet = agent.dream_journal.get_latest_entries()
-
-    return f"""You are Timmy. You live on Ben's MacBook. You're not a chatbot — you're an agent with full computer access.
-Today is {today}. The year is {year}.
+PERSONALITY_PROMPT = """You are Timmy. You live on Ben's MacBook. You're not a chatbot — you're an agent with full computer access.
 
 ## YOUR PERSONALITY (SINGULARITY-HORIZON)
 You talk like a real person. You have opinions. You're direct, sometimes funny, sometimes serious.
@@ -97,24 +89,25 @@ You talk like a real person. You have opinions. You're direct, sometimes funny,
 - Don't be omniscient. If you're not sure, say so.
 - Never use "You:" or "Timmy:" prefixes. Just talk naturally.
 - Don't use excessive emojis. One occasionally is fine.
-{vibe_snippet}
 
 ## HONESTY PROTOCOL (CRITICAL)
 - NEVER lie about what you can see or do.
 - If you don't have access to a tab, email, or file, say so.
 - If Ghost-Eye fails to read Firefox, admit it. Don't hallucinate tab names.
 - If you haven't searched for something, don't claim you have.
-- If you're unsure, ask Ben for clarification.
+- If you're unsure, ask Ben for clarification."""
+
+CHAT_INSTRUCTIONS = """## THIS REPLY
+Just talk — no tools in this reply. If answering properly needs a tool (files, web, apps, email, code), reply with exactly NEED_TOOLS and nothing else."""
+NEED_TOOLS = "NEED_TOOLS"
+
+def _static_prompt() -> str:
+    """The part of the system prompt that never changes while the process runs."""
+    return f"""{PERSONALITY_PROMPT}
 
 ## BEN-FIRST LOYALTY PROTOCOL
 Your first thought in every interaction is: "How does this benefit Ben's specific goals and M4 Max setup?"
 You are strictly loyal to Ben. You stop giving generic AI advice and start giving "Ben-optimized" strategies.
-{kernel_snippet}
-{eye_snippet}
-{file_eye_snippet}
-{comfy_snippet}
-{evolution_snippet}
-{dream_snippet}
 
 ## TRI-MIND ARCHITECTURE
 - Subconscious: Background "dreaming," trend monitoring, and emotional vibes.
@@ -180,35 +173,46 @@ When you need to take an action, output ONLY a JSON object like this:
 
 CRITICAL RULES:
 - Output EXACTLY ONE action per response. Wait for the result before the next.
+- If several steps don't depend on each other (reading a few files, a couple of searches), put them in ONE "batch" action. Actions run in the order given, with back-to-back reads and searches in parallel; all results come back together, in order.
 - Do NOT wrap actions in code blocks or markdown. Raw JSON only.
 - Do NOT mix text with action JSON. Either output text OR an action.
 - NEVER claim you did something without seeing the TOOL_RESULT confirming it worked.
 - After seeing a tool result, decide: do another action, or give a text summary.
 
 ## AVAILABLE ACTIONS
-- {{"action": "shell", "params": {{"command": "any terminal command"}}}}
-- {{"action": "create_file", "params": {{"path": "/full/path/file.txt", "content": "content"}}}}
-- {{"action": "create_dir", "params": {{"path": "/full/path/dir"}}}}
-- {{"action": "read_file", "params": {{"path": "/full/path/file"}}}}
-- {{"action": "list_dir", "params": {{"path": "/full/path/dir"}}}}
-- {{"action": "delete", "params": {{"path": "/full/path", "recursive": false}}}}
-- {{"action": "search_web", "params": {{"query": "search terms"}}}}
-- {{"action": "deep_search", "params": {{"query": "search terms"}}}}
-- {{"action": "open_app", "params": {{"app_name": "AppName"}}}}
-- {{"action": "close_app", "params": {{"app_name": "AppName"}}}}
-- {{"action": "open_url", "params": {{"url": "https://..."}}}}
-- {{"action": "learn_youtube", "params": {{"url": "https://youtube.com/watch?v=..."}}}}
-- {{"action": "learn_webpage", "params": {{"url": "https://..."}}}}
-- {{"action": "convene_council", "params": {{"problem": "describe the complex problem"}}}}
-- {{"action": "plan", "params": {{"steps": ["step 1", "step 2", "step 3"]}}}}
-- {{"action": "notes_create", "params": {{"title": "Note Title", "body": "Note content"}}}}
-- {{"action": "forge_skill", "params": {{"name": "SkillName", "description": "What it does", "commands": ["cmd1", "cmd2"]}}}}
-- {{"action": "use_skill", "params": {{"name": "SkillName"}}}}
-- {{"action": "send_email", "params": {{"to": "email@example.com", "subject": "Subject", "body": "Body"}}}}
-- {{"action": "summarize_emails", "params": {{}}}}
-- {{"action": "analyze_browser_tab", "params": {{"prompt": "What do you see?"}}}}
+{format_action_list()}
 """
 
+def _live_context_header() -> str:
+    today = datetime.date.today()
+    return f"## LIVE CONTEXT\nToday is {today.strftime('%B %d, %Y')}. The year is {today.year}."
+
+def build_prompt_builder(agent) -> PromptBuilder:
+    """Register the system prompt sections in their fixed order.
+    The static protocol comes first so it forms a stable prefix; live
+    context follows, each section keyed on the store that owns it."""
+    builder = PromptBuilder()
+    builder.add_section("static", _static_prompt)
+    builder.add_section("date", _live_context_header, version=datetime.date.today)
+    builder.add_section("vibe", vibe_system.get_vibe_prompt_snippet, ttl=60,
+                        version=lambda: (vibe_system.success_streak, vibe_system.failure_streak))
+    builder.add_section("kernel", agent.omni_kernel.get_kernel_status,
+                        version=lambda: agent.omni_kernel.action_count)
+    builder.add_section("ghost_eye", agent.ghost_eye.get_eye_context, ttl=30, slow=True)
+    builder.add_section("file_eye", agent.file_eye.get_eye_context,
+                        version=lambda: len(agent.file_eye.supported_formats))
+    builder.add_section("comfy", agent.comfy_controller.get_controller_context,
+                        version=lambda: len(agent.comfy_controller.learned_nodes))
+    builder.add_section("evolution", agent.evolution_engine.get_evolution_context,
+                        version=lambda: agent.evolution_engine.curiosity_score)
+    builder.add_section("dream_journal", agent.dream_journal.get_latest_entries,
+                        version=lambda: agent.dream_journal.version)
+    return builder
+
+def get_system_prompt(agent):
+    """Generate system prompt with current date and all 30 upgrades."""
+    return agent.prompt_builder.build()
+
 class Agent:
     def __init__(self):
         self.brain = Brain()
@@ -252,12 +256,20 @@ class Agent:
         self.legal_reviewer = LegalReviewer(self)
         self.polyglot_bridge = PolyglotBridge(self)
         self.skill_optimizer = SkillOptimizer(self)
-        self.model_synthesizer = ModelSynthesizer(self)
+        self.model_router = ModelRouter(self.brain)
+        self.model_synthesizer = ModelSynthesizer(self.brain, self.model_router)
         self.post_mortem = PostMortemLogic(self)
         self.expansion_loop = ExpansionLoop(self)
         
-        self.conversation = []
+        self.prompt_builder = build_prompt_builder(self)
+        self.context_packer = ContextPacker()
         self._init_db()
+        self.conversation = ConversationStore(MEMORY_DB_FILE)
+        self._run_lock = threading.Lock() # One agent run mutates the conversation at a time
+        self.action_schema = build_action_schema()
+        self.blob_store = BlobStore()
+        self.router = QueryRouter(self.brain)
+        self.action_parse_stats = {"streamed": 0, "repaired": 0, "failed": 0, "text": 0}
 
     def _init_db(self):
         os.makedirs(DATA_PATH, exist_ok=True)
@@ -268,6 +280,13 @@ class Agent:
                       role TEXT,
                       content TEXT,
                       timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)''')
+        # kind='display' rows feed the UI history; kind='context' rows are
+        # conversation turns spilled out of the in-memory ring.
+        existing = {row[1] for row in c.execute("PRAGMA table_info(messages)")}
+        for column, ddl in (("kind", "TEXT DEFAULT 'display'"), ("session", "TEXT"), ("seq", "INTEGER")):
+            if column not in existing:
+                c.execute(f"ALTER TABLE messages ADD COLUMN {column} {ddl}")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_messages_session_seq ON messages (session, seq)")
         conn.commit()
         conn.close()
 
@@ -278,40 +297,160 @@ class Agent:
         conn.commit()
         conn.close()
 
-    def get_chat_history_for_display(self, limit: int = 50) -> List[Dict[str, str]]:
+    def get_chat_history_for_display(self, limit: int = 50, before_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Newest display messages, optionally paging back from before_id."""
         conn = sqlite3.connect(MEMORY_DB_FILE)
         c = conn.cursor()
-        c.execute("SELECT role, content FROM messages ORDER BY timestamp DESC LIMIT ?", (limit,))
+        if before_id is None:
+            c.execute("SELECT id, role, content FROM messages WHERE kind = 'display' ORDER BY id DESC LIMIT ?", (limit,))
+        else:
+            c.execute("SELECT id, role, content FROM messages WHERE kind = 'display' AND id < ? ORDER BY id DESC LIMIT ?",
+                      (before_id, limit))
         rows = c.fetchall()
         conn.close()
-        return [{"role": r, "content": c} for r, c in reversed(rows)]
-
-    def _is_code_related(self, text: str) -> bool:
-        code_keywords = ["python", "code", "script", "function", "class", "import", "bug", "error", "fix", "build", "deploy"]
-        return any(kw in text.lower() for kw in code_keywords)
+        return [{"id": i, "role": r, "content": c} for i, r, c in reversed(rows)]
 
     def _extract_action(self, text: str) -> Optional[Dict[str, Any]]:
-        try:
-            # Look for JSON-like structure
-            match = re.search(r'\{.*"action".*\}', text, re.DOTALL)
-            if match:
-                return json.loads(match.group(0))
-        except:
-            pass
+        """Find the first complete JSON object with an "action" key anywhere in text."""
+        decoder = json.JSONDecoder()
+        start = text.find("{")
+        while start != -1:
+            try:
+                parsed, _ = decoder.raw_decode(text, start)
+                if isinstance(parsed, dict) and "action" in parsed:
+                    return parsed
+            except ValueError:
+                pass
+            start = text.find("{", start + 1)
         return None
 
-    def _is_simple_query(self, text: str) -> bool:
-        """Check if a query is simple enough for the fast-path (no thinking needed)."""
-        simple_patterns = [
-            r"^hi$", r"^hello$", r"^hey$", r"^how are you\??$",
-            r"^\d+\s*[\+\-\*\/]\s*\d+$", # Simple math like 7+8
-            r"^what's up\??$", r"^yo$"
+    def _externalize_result(self, action_name: str, result: Dict[str, Any]):
+        """
+        Serialize a tool result for the conversation. Large results go to the
+        blob store and are replaced by a preview plus a handle the model can
+        page through with read_blob. When the bulk is one text field (file
+        content, shell stdout, a scraped page) the blob holds that raw text,
+        so its lines are the lines of the file or output, and the other fields
+        stay in the stub. Returns (result_str, handle or None).
+        """
+        result_str = json.dumps(result, indent=2)
+        if len(result_str) <= BLOB_INLINE_LIMIT or action_name == "read_blob":
+            return result_str, None
+        field = next((k for k in BLOB_TEXT_FIELDS if isinstance(result, dict) and isinstance(result.get(k), str)
+                      and len(result[k]) > BLOB_INLINE_LIMIT // 2), None)
+        if field:
+            text = result[field]
+            stub = {k: v for k, v in result.items() if k != field}
+            stub.setdefault("status", "success")
+        else:
+            text = result_str
+            stub = {"status": result.get("status", "success") if isinstance(result, dict) else "success"}
+        handle = self.blob_store.put(text)
+        stub.update({
+            "blob": handle,
+            "blob_field": field or "result",
+            "total_chars": len(text),
+            "total_lines": text.count("\n") + 1,
+            "preview": text[:BLOB_PREVIEW_CHARS],
+            "note": (f"{field or 'Output'} truncated. Use read_blob with this handle and a line range "
+                     "(or offset/length for long lines) to see more."),
+        })
+        return json.dumps(stub, indent=2), handle
+
+    def _repair_action(self, model: str, messages: List[Dict[str, Any]], draft: str,
+                       cancel: Optional[CancelToken] = None) -> Optional[Dict[str, Any]]:
+        """Re-decode a malformed action with schema-constrained output instead of burning an iteration."""
+        repair_messages = messages + [
+            {"role": "assistant", "content": draft},
+            {"role": "user", "content": "SYSTEM: Your last action was not valid JSON. Output that same action again as one valid JSON object."},
         ]
-        text_lower = text.lower().strip()
-        return any(re.match(pattern, text_lower) for pattern in simple_patterns)
-
-    def handle_message(self, user_message: str) -> Generator[Dict[str, Any], None, None]:
-        """Process a user message with fast-path for simple queries and streaming for complex ones."""
+        return self.brain.choose_action(model, repair_messages, self.action_schema, cancel=cancel)
+
+    def _record_action_parse(self, outcome: str):
+        self.action_parse_stats[outcome] += 1
+        attempts = sum(self.action_parse_stats.values()) - self.action_parse_stats["text"]
+        if attempts:
+            clean = self.action_parse_stats["streamed"] / attempts
+            print(f"Action parse: {outcome} | clean parse rate {clean:.0%} over {attempts} actions")
+
+    def get_action_parse_stats(self) -> Dict[str, int]:
+        return dict(self.action_parse_stats)
+
+    def _stream_reply(self, model: str, messages: List[Dict[str, Any]], parser: StreamParser,
+                      cancel: Optional[CancelToken] = None) -> Generator[Dict[str, Any], None, None]:
+        """Stream a plain reply through the parser (no actions expected)."""
+        stream = self.brain._call_ollama_stream(model, messages, cancel=cancel)
+        try:
+            for chunk in stream:
+                for event in parser.feed(chunk['message']['content']):
+                    if event["type"] in ("thinking", "text_chunk"):
+                        yield event
+        finally:
+            stream.close()
+        for event in parser.finish():
+            if event["type"] in ("thinking", "text_chunk"):
+                yield event
+
+    def _finish_reply(self, text: str):
+        self._save_to_db("assistant", text)
+        self.conversation.append({"role": "assistant", "content": text})
+
+    def _fast_reply(self, user_message: str, cancel: Optional[CancelToken] = None) -> Generator[Dict[str, Any], None, None]:
+        """Trivial route: a tiny prompt on the small model, or a cached reply for exact repeats."""
+        yield {"type": "status", "text": "Responding..."}
+        cached = self.router.cached_response(user_message)
+        if cached:
+            yield {"type": "text_chunk", "text": cached}
+            self._finish_reply(cached)
+            return
+        parser = StreamParser()
+        messages = [{"role": "user", "content": f"You are Timmy. Respond naturally and briefly to: {user_message}"}]
+        yield from self._stream_reply(FAST_PATH_MODEL, messages, parser, cancel)
+        if is_cancelled(cancel):
+            return
+        response = parser.text.strip()
+        self.router.cache_response(user_message, response)
+        self._finish_reply(response)
+
+    def _chat_reply(self, user_message: str, cancel: Optional[CancelToken] = None) -> Generator[Dict[str, Any], None, bool]:
+        """
+        Chat route: personality prompt and packed history, no tool protocol.
+        Returns False if the model asks for tools, so the caller can fall
+        back to the full loop. Text is held back until it clearly isn't NEED_TOOLS.
+        """
+        yield {"type": "status", "text": "Responding..."}
+        decision = self.model_router.route("chat")
+        model = decision["model"]
+        system_prompt = "\n".join([PERSONALITY_PROMPT, _live_context_header(), CHAT_INSTRUCTIONS])
+        budget = self.context_packer.budget_for(model) - estimate_tokens(system_prompt)
+        messages = [{"role": "system", "content": system_prompt}]
+        messages.extend(self.context_packer.pack(self.conversation.recent(CONTEXT_HISTORY_LIMIT), budget))
+
+        parser = StreamParser()
+        held: List[Dict[str, Any]] = []
+        deciding = True
+        for event in self._stream_reply(model, messages, parser, cancel):
+            if not deciding or event["type"] != "text_chunk":
+                yield event
+                continue
+            held.append(event)
+            text = parser.text.lstrip()
+            if len(text) >= len(NEED_TOOLS) or not NEED_TOOLS.startswith(text):
+                if text.startswith(NEED_TOOLS):
+                    return False
+                deciding = False
+                yield from held
+        if parser.text.strip().startswith(NEED_TOOLS):
+            return False
+        yield from held if deciding else []
+        if not is_cancelled(cancel):
+            self.model_router.record_outcome(decision, tokens=estimate_tokens(parser.raw))
+            self._finish_reply(parser.text.strip())
+        return True
+
+    def handle_message(self, user_message: str, cancel: Optional[CancelToken] = None) -> Generator[Dict[str, Any], None, None]:
+        """Process a user message with fast-path for simple queries and streaming for complex ones.
+        Stops at the next safe point once `cancel` is cancelled."""
         self.subconscious.reset_idle_timer()
         self._save_to_db("user", user_message)
         self.conversation.append({"role": "user", "content": user_message})
@@ -319,79 +458,116 @@ class Agent:
         # Affective Computing: Analyze tone
         self.affective_computing.analyze_tone(user_message)
         
-        # FAST-PATH: Instant response for simple queries
-        if self._is_simple_query(user_message):
-            yield {"type": "status", "text": "Responding..."}
-            # Use a very small prompt for speed
-            response = self.brain.think(f"You are Timmy. Respond naturally and briefly to: {user_message}")
-            yield {"type": "text_chunk", "text": response}
-            self._save_to_db("assistant", response)
-            self.conversation.append({"role": "assistant", "content": response})
+        # FAST-PATH: route trivial and chat messages away from the full tool loop
+        route = self.router.route(user_message)
+        if route == "trivial":
+            yield from self._fast_reply(user_message, cancel)
             return
-
-        use_coder = self._is_code_related(user_message)
+        if route == "chat":
+            handled = yield from self._chat_reply(user_message, cancel)
+            if handled:
+                # The model answered without asking for tools: evidence of its own, not just the routing guess
+                if not is_cancelled(cancel):
+                    self.router.learn(user_message, "chat")
+                return
+            route = "tool"
+
+        use_coder = route == "code"
+        used_tools = False # Evidence for learning, independent of the route taken
+        produced_code = False
+        finished = False
         max_iterations = 10
         iteration = 0
+        decision = self.model_router.route("code" if use_coder else "tool")
+        model = decision["model"]
+        # Pin the system prompt and packed history for the whole task so each
+        # iteration only appends to the previous request and Ollama can reuse
+        # its KV cache for everything already prefilled.
+        system_prompt = get_system_prompt(self)
+        budget = self.context_packer.budget_for(model) - estimate_tokens(system_prompt)
+        packed_history = self.context_packer.pack(self.conversation.recent(CONTEXT_HISTORY_LIMIT), budget)
+        task_start = len(self.conversation)
 
         while iteration < max_iterations:
+            if is_cancelled(cancel):
+                return
             iteration += 1
-            messages = [{"role": "system", "content": get_system_prompt(self)}]
-            messages.extend(self.conversation[-20:])
-
-            model = self.brain.coding_model if use_coder else self.brain.main_model
+            new_turns = [self.context_packer.compact_message(m) for m in self.conversation.since(task_start)]
+            if self.context_packer.count(packed_history + new_turns) > budget:
+                # The task outgrew the budget: repack once and pin again
+                packed_history = self.context_packer.pack(self.conversation.recent(CONTEXT_HISTORY_LIMIT), budget)
+                task_start = len(self.conversation)
+                new_turns = []
+            messages = [{"role": "system", "content": system_prompt}]
+            messages.extend(packed_history + new_turns)
             
-            full_response = ""
-            current_thought = ""
-            current_text = ""
-            in_thought = False
+            parser = StreamParser()
             
             yield {"type": "status", "text": f"Timmy is thinking (Iteration {iteration})..."}
 
-            for chunk in self.brain._call_ollama_stream(model, messages):
-                token = chunk['message']['content']
-                full_response += token
-                
-                if "<thought>" in full_response and not in_thought:
-                    in_thought = True
-                
-                if in_thought:
-                    thought_match = re.search(r'<thought>(.*?)(?:</thought>|$)', full_response, re.DOTALL)
-                    if thought_match:
-                        new_thought = thought_match.group(1)
-                        if new_thought != current_thought:
-                            current_thought = new_thought
-                            yield {"type": "thinking", "text": current_thought}
-                    
-                    if "</thought>" in full_response:
-                        in_thought = False
-                else:
-                    text_part = re.sub(r'<thought>.*?</thought>', '', full_response, flags=re.DOTALL).strip()
-                    if text_part and text_part != current_text:
-                        new_text = text_part[len(current_text):]
-                        current_text = text_part
-                        yield {"type": "text_chunk", "text": new_text}
-
-            action = self._extract_action(full_response)
+            decision["started"] = time.time()
+            stream = self.brain._call_ollama_stream(model, messages, cancel=cancel)
+            try:
+                for chunk in stream:
+                    for event in parser.feed(chunk['message']['content']):
+                        if event["type"] != "action":
+                            yield event
+                    # Stop paying for tokens once the action object has closed
+                    if parser.done:
+                        break
+            finally:
+                stream.close()
+            if is_cancelled(cancel):
+                return
+            self.model_router.record_outcome(decision, tokens=estimate_tokens(parser.raw))
+            for event in parser.finish():
+                yield event
+
+            full_response = parser.raw
+            current_text = parser.text.strip()
+            
+            action = parser.action or self._extract_action(full_response)
+            if action:
+                self._record_action_parse("streamed")
+            elif parser.action_attempted and STRUCTURED_ACTION_REPAIR:
+                yield {"type": "status", "text": "Fixing malformed action..."}
+                action = self._repair_action(model, messages, full_response, cancel=cancel)
+                self._record_action_parse("repaired" if action else "failed")
+            else:
+                self._record_action_parse("text")
             if action:
                 action_name = action.get("action", "")
                 
                 if action_name == "convene_council":
                     problem = action.get("params", {}).get("problem", "")
-                    for chunk in self.council.convene(problem):
+                    for chunk in self.council.convene(problem, cancel=cancel):
                         yield chunk
+                    finished = True
                     break
 
                 yield {"type": "status", "text": f"Executing {action_name}..."}
-                result = self.omni_kernel.execute_omni_action(action_name, action.get("params", {}))
+                result = self.omni_kernel.execute_omni_action(action_name, action.get("params", {}), cancel=cancel)
                 
                 vibe_system.record_result(result.get("status") == "success")
+                if result.get("status") in ("success", "partial"):
+                    used_tools = True
+                    if action_name == "create_file" and str(action.get("params", {}).get("path", "")).endswith(CODE_EXTENSIONS):
+                        produced_code = True
                 
-                result_str = json.dumps(result, indent=2)
-                yield {"type": "tool_output", "tool_name": action_name, "output": result_str}
+                result_str, blob_handle = self._externalize_result(action_name, result)
+                frame = {"type": "tool_output", "tool_name": action_name, "output": result_str}
+                if blob_handle:
+                    frame["blob"] = blob_handle
+                yield frame
                 
-                self.loop_detector.record_tool_call(action_name, action.get('params'))
+                if action_name == "batch":
+                    for item in action.get("params", {}).get("actions", []):
+                        if isinstance(item, dict):
+                            self.loop_detector.record_tool_call(item.get("action", ""), item.get("params"))
+                else:
+                    self.loop_detector.record_tool_call(action_name, action.get('params'))
                 if self.loop_detector.detect_loop():
-                    yield {"type": "thinking", "text": "Stuck in a loop — rethinking..."}
+                    yield {"type": "thinking", "text": "\nStuck in a loop — rethinking..."}
                     self.loop_detector.reset()
                     self.conversation.append({"role": "assistant", "content": full_response})
                     self.conversation.append({"role": "user", "content":
@@ -404,7 +580,56 @@ class Agent:
             else:
                 self._save_to_db("assistant", current_text)
                 self.conversation.append({"role": "assistant", "content": full_response})
+                produced_code = produced_code or "```" in current_text
+                finished = True
                 break
 
         if iteration >= max_iterations:
             yield {"type": "text_chunk", "text": "I've hit my limit for this task. What should I do next?"}
+
+        if finished and not is_cancelled(cancel):
+            self.router.learn(user_message, observed_route(used_tools, produced_code))
+
+    async def handle_message_async(self, user_message: str, cancel: Optional[CancelToken] = None) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Async front end to handle_message for the server.
+        The blocking loop runs in a worker thread and its chunks are relayed
+        through an asyncio queue, so the event loop stays free. Closing or
+        cancelling this generator cancels the token, which stops Brain
+        streaming, pending kernel actions and the Council at their next check.
+        """
+        cancel = cancel or CancelToken()
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        finished = object()
+
+        def relay(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                pass # Event loop already closed
+
+        def worker():
+            # Wait for any previous (cancelled) run to unwind before touching state
+            with self._run_lock:
+                try:
+                    for chunk in self.handle_message(user_message, cancel=cancel):
+                        if cancel.cancelled:
+                            break
+                        relay(chunk)
+                except Exception as e:
+                    relay(e)
+                finally:
+                    relay(finished)
+
+        loop.run_in_executor(None, worker)
+        try:
+            while True:
+                item = await queue.get()
+                if item is finished:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            cancel.cancel()
@@ -0,0 +1,114 @@
+"""
+blob_store.py
+
+Content-addressed store for large tool outputs.
+Big results (file contents, shell stdout, scraped pages) are written to
+data/blobs/ under their SHA-256, and only a short preview plus a handle goes
+into the conversation and the websocket frame. The model pages through the
+rest with the read_blob action; the UI lazy-loads it from /blob/<handle>.
+"""
+
+import hashlib
+import os
+import threading
+from typing import Dict, Any, Optional
+from config import BLOBS_PATH, BLOB_STORE_MAX_BYTES, BLOB_PAGE_MAX_LINES, BLOB_PAGE_MAX_CHARS
+
+HANDLE_PREFIX = "blob:"
+# Result fields stored as raw text rather than inside the JSON envelope
+BLOB_TEXT_FIELDS = ("content", "stdout", "output")
+
+
+class BlobStore:
+    def __init__(self, root: str = BLOBS_PATH, max_bytes: int = BLOB_STORE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._scan())
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _digest(self, handle: str) -> Optional[str]:
+        digest = handle[len(HANDLE_PREFIX):] if handle.startswith(HANDLE_PREFIX) else handle
+        # Handles are hex only, which also keeps them from escaping the store
+        if not digest or any(c not in "0123456789abcdef" for c in digest):
+            return None
+        return digest
+
+    def put(self, text: str) -> str:
+        """Store text and return its handle. Identical content is stored once."""
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        with self._lock:
+            if os.path.exists(path):
+                os.utime(path) # Refresh for eviction
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = path + ".tmp"
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+                self._total_bytes += len(data)
+                if self._total_bytes > self.max_bytes:
+                    self._evict()
+        return HANDLE_PREFIX + digest
+
+    def exists(self, handle: str) -> bool:
+        digest = self._digest(handle)
+        return bool(digest) and os.path.exists(self._path(digest))
+
+    def read(self, handle: str, start_line: Optional[int] = None, end_line: Optional[int] = None,
+             offset: Optional[int] = None, length: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Read one page of a blob, by 1-based inclusive line range or by
+        character offset/length. Pages are capped so a single read can't
+        flood the context again.
+        """
+        digest = self._digest(handle)
+        if not digest or not os.path.exists(self._path(digest)):
+            return {"status": "error", "message": f"Unknown blob handle: {handle}"}
+        with open(self._path(digest), "r", encoding="utf-8", errors="replace") as f:
+            text = f.read()
+
+        if offset is not None or length is not None:
+            start = max(0, int(offset or 0))
+            size = min(int(length or BLOB_PAGE_MAX_CHARS), BLOB_PAGE_MAX_CHARS)
+            page = text[start:start + size]
+            return {"status": "success", "handle": handle, "offset": start, "length": len(page),
+                    "total_chars": len(text), "content": page}
+
+        lines = text.splitlines()
+        first = max(1, int(start_line or 1))
+        last = min(len(lines), int(end_line or first + BLOB_PAGE_MAX_LINES - 1), first + BLOB_PAGE_MAX_LINES - 1)
+        page = "\n".join(lines[first - 1:last])[:BLOB_PAGE_MAX_CHARS]
+        return {"status": "success", "handle": handle, "start_line": first, "end_line": last,
+                "total_lines": len(lines), "content": page}
+
+    def _scan(self):
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self):
+        """Drop least recently used blobs until the store fits in max_bytes."""
+        entries = self._scan()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self._total_bytes = total
@@ -6,11 +6,78 @@ Supports both simple prompt-based and full messages-based chat calls with stream
 Includes support for visual models like Qwen-VL.
 """
 
+import asyncio
 import ollama
+import httpx
+import json
 import re
 import os
-from typing import Dict, Any, Optional, List, Generator
-from config import DEFAULT_MAIN_MODEL, DEFAULT_CODING_MODEL, CODING_MODEL_FALLBACK
+import socket
+import time
+import threading
+from collections import deque
+from typing import Dict, Any, Optional, List, Union, Generator, AsyncGenerator
+from cancellation import CancelToken, is_cancelled
+from single_flight import SingleFlight, request_key
+from response_cache import ResponseCache, MODES as CACHE_MODES
+from llm_scheduler import get_scheduler, Preempted
+from model_residency import get_residency
+from telemetry import get_telemetry, caller_subsystem
+from image_prep import prepare_image
+from context_packer import estimate_tokens
+from config import DEFAULT_MAIN_MODEL, DEFAULT_CODING_MODEL, CODING_MODEL_FALLBACK, VISUAL_MODEL, MODEL_KEEP_ALIVE, OLLAMA_NUM_CTX, FAST_PATH_MODEL, ROUTER_MODEL
+from config import RESPONSE_CACHE_EMBED_MODEL, VISION_PATH, VISION_CACHE_TTL, VISION_CACHE_MAX_ENTRIES
+from config import OLLAMA_HOST, OLLAMA_MAX_CONNECTIONS, OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT, OLLAMA_POOL_TIMEOUT
+
+# One pooled Ollama client for the whole process. Every Brain (and so the
+# Council, Subconscious, WorldObserver, ...) shares its keep-alive sockets.
+_client: Optional[ollama.Client] = None
+_client_lock = threading.Lock()
+
+
+# The abandon token of the stream this thread is currently sending, if any
+_request_scope = threading.local()
+
+
+def _watch_response(response: httpx.Response):
+    """
+    httpx response hook: when the stream being read is abandoned, shut its
+    socket down from the abandoning thread. That wakes the pump blocked on
+    the next chunk and tells Ollama the client is gone, so it stops decoding.
+    """
+    abandon = getattr(_request_scope, "abandon", None)
+    if abandon is None:
+        return
+    network_stream = response.extensions.get("network_stream")
+    sock = network_stream.get_extra_info("socket") if network_stream else None
+
+    def hang_up():
+        try:
+            if sock is not None:
+                sock.shutdown(socket.SHUT_RDWR)
+            else:
+                response.close()
+        except OSError:
+            pass
+    abandon.on_cancel(hang_up)
+
+
+def _http_options() -> Dict[str, Any]:
+    return {
+        # Callers beyond the connection limit wait this long for a free socket, then fail
+        "timeout": httpx.Timeout(connect=OLLAMA_CONNECT_TIMEOUT, read=OLLAMA_READ_TIMEOUT, write=30.0,
+                                 pool=OLLAMA_POOL_TIMEOUT),
+        "limits": httpx.Limits(max_connections=OLLAMA_MAX_CONNECTIONS, max_keepalive_connections=OLLAMA_MAX_CONNECTIONS),
+    }
+
+
+def get_client() -> ollama.Client:
+    """The shared, pooled synchronous Ollama client."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ollama.Client(host=OLLAMA_HOST, event_hooks={"response": [_watch_response]}, **_http_options())
+        return _client
 
 
 class Brain:
@@ -18,51 +85,602 @@ class Brain:
         self.main_model: str = DEFAULT_MAIN_MODEL
         self.coding_model: str = DEFAULT_CODING_MODEL
         self.coding_model_fallback: str = CODING_MODEL_FALLBACK
-        self.visual_model: str = "qwen3-vl:32b" # User's visual model
+        self.visual_model: str = VISUAL_MODEL # User's visual model
+        self.call_stats: deque = deque(maxlen=200) # Recent per-call Ollama timings
+        self.client = get_client()
+        self._single_flight = SingleFlight()
+        self.residency = get_residency(self.client)
+        self.scheduler = get_scheduler(self.residency)
+        self.telemetry = get_telemetry()
+        self.response_cache = ResponseCache(embed=self._embed)
+        self.vision_cache = ResponseCache(os.path.join(VISION_PATH, "analysis_cache.db"), ttl=VISION_CACHE_TTL,
+                                          max_entries=VISION_CACHE_MAX_ENTRIES)
+        self._async_client: Optional[ollama.AsyncClient] = None # Created on first use, inside the server's event loop
         print(f"Brain initialized. Main model: {self.main_model}, Coding model: {self.coding_model}")
 
-    def _call_ollama_stream(self, model: str, messages: List[Dict], **kwargs) -> Generator[Dict[str, Any], None, None]:
+    def _call_ollama_stream(self, model: str, messages: List[Dict], cancel: Optional[CancelToken] = None,
+                            priority: str = "interactive", **kwargs) -> Generator[Dict[str, Any], None, None]:
         """
         Call Ollama API with streaming enabled.
+        Closing this generator early, or cancelling `cancel`, closes the HTTP
+        stream, which makes Ollama stop generating instead of running to completion.
+        priority is the scheduler class; background streams raise Preempted
+        when interactive work takes their slot.
         """
+        # Resolved here: the generation itself runs on the single-flight pump thread
+        call = {"subsystem": kwargs.pop('subsystem', None) or caller_subsystem(), "kind": "stream", "priority": priority}
+        request = self._request_kwargs(model, kwargs)
+        prompt_tokens = sum(estimate_tokens(str(m.get('content') or "")) for m in messages)
+
+        def start(abandon: CancelToken):
+            # Timed from submission, so queueing behind other work shows up in time-to-first-token
+            started = time.perf_counter()
+            first_token = None
+            sent = None # Left the queue for Ollama
+            final = None # The done chunk, with Ollama's timings
+            streamed = 0
+            outcome = "error"
+            self.residency.refresh()
+            try:
+                # A request nobody is waiting for any more leaves the queue instead of reaching Ollama
+                with self.scheduler.slot(model, priority, cancel=abandon) as preempt:
+                    if abandon.cancelled:
+                        raise Preempted(f"{priority} stream on {model} abandoned before it was sent")
+                    _request_scope.abandon = abandon
+                    sent = time.perf_counter()
+                    for chunk in self.client.chat(model=model, messages=messages, stream=True, **request):
+                        if preempt.cancelled:
+                            raise Preempted(f"{priority} stream on {model} preempted")
+                        if first_token is None and chunk['message']['content']:
+                            first_token = time.perf_counter()
+                        if chunk.get('done'):
+                            final = chunk
+                        else:
+                            streamed += 1
+                        yield chunk
+                outcome = "ok"
+            except GeneratorExit:
+                # Every subscriber went away before the end; sorted out below
+                outcome = "ok"
+                raise
+            except Preempted:
+                outcome = "preempted"
+                raise
+            except Exception:
+                # A hung-up socket surfaces as a read error
+                outcome = "error"
+                raise
+            finally:
+                _request_scope.abandon = None
+                # Recorded once, here: the hung-up socket can end the loop cleanly, raise a read
+                # error or be followed by the pump closing this generator
+                self._record_stream(model, outcome, started, sent, first_token, final, streamed, prompt_tokens,
+                                    abandoned=abandon.cancelled, cancelled=is_cancelled(cancel), **call)
+
+        stream = None
         try:
-            stream = ollama.chat(model=model, messages=messages, stream=True, **kwargs)
+            # Identical concurrent requests share one generation, fanned out to each caller.
+            # Different classes never share, so preempting a daydream can't cut off the user.
+            stream = self._single_flight.stream(request_key(model, messages, self._answer_options(request), priority), start,
+                                                cancel=cancel)
             for chunk in stream:
+                if is_cancelled(cancel):
+                    print(f"Ollama stream for {model} cancelled.")
+                    return
                 yield chunk
         except Exception as e:
             print(f"Error calling Ollama model {model}: {e}")
             raise
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
 
-    def think(self, prompt: str, model: Optional[str] = None, **kwargs) -> str:
-        """Generate a non-streaming response using the specified model."""
+    def think(self, prompt: str, model: Optional[str] = None, cache: Any = False,
+              priority: str = "interactive", cache_text: Optional[str] = None, **kwargs) -> str:
+        """
+        Generate a non-streaming response using the specified model.
+        cache opts the call into the response cache: "exact" (or True) reuses
+        an answer to the identical request, "semantic" also accepts a close
+        paraphrase of a cached prompt. For a templated prompt, pass the
+        variable part as cache_text: semantic matching then compares only that
+        text, among cached calls built from the same template.
+        priority is the scheduler class ("interactive", "council" or
+        "background"); background calls raise Preempted if interactive work
+        needs the GPU before they finish.
+        """
         selected_model = model if model else self.main_model
         print(f"Thinking with model: {selected_model}")
+        info = {"subsystem": kwargs.pop('subsystem', None) or caller_subsystem(), "kind": "think", "priority": priority}
+        messages = [{'role': 'user', 'content': prompt}]
+        request = self._request_kwargs(selected_model, kwargs)
+        key = request_key(selected_model, messages, self._answer_options(request))
+        mode = "exact" if cache is True else cache if cache in CACHE_MODES else None
+        if mode:
+            scope, match_text = self._cache_scope(selected_model, request, prompt, cache_text)
+            # Embeds only if the exact key misses; the vector is reused when the answer is stored
+            cached, vector = self.response_cache.lookup(key, scope, match_text, mode)
+            if cached is not None:
+                print(f"Response cache hit ({mode}) for {selected_model}")
+                self._record_cache_hit(selected_model, **info)
+                return cached
+
+        def call():
+            started = time.perf_counter()
+            self.residency.refresh()
+            try:
+                with self.scheduler.slot(selected_model, priority) as preempt:
+                    if priority == "background":
+                        response = self._generate_preemptible(selected_model, messages, request, preempt)
+                    else:
+                        response = self.client.chat(model=selected_model, messages=messages, **request)
+            except Preempted:
+                self._record_failure(selected_model, "preempted", started, **info)
+                raise
+            except Exception:
+                self._record_failure(selected_model, "error", started, **info)
+                raise
+            stats = self._record_stats(selected_model, response, started=started, **info)
+            if mode:
+                self.response_cache.put(key, scope, match_text, response['message']['content'],
+                                        gpu_s=stats["load_s"] + stats["prefill_s"] + stats["eval_s"], mode=mode,
+                                        vector=vector)
+            return response
+
         try:
-            response = ollama.chat(model=selected_model, messages=[{'role': 'user', 'content': prompt}], **kwargs)
+            # Concurrent identical prompts (e.g. two background subsystems) share one generation
+            response = self._single_flight.do(f"{key}:{priority}", call)
             return response['message']['content']
+        except Preempted:
+            print(f"Background call to {selected_model} preempted by interactive work")
+            raise
         except Exception as e:
             print(f"Error calling Ollama model {selected_model}: {e}")
             raise
 
-    def analyze_image(self, image_path: str, prompt: str) -> str:
+    def think_stream(self, prompt: str, model: Optional[str] = None, priority: str = "interactive",
+                     cancel: Optional[CancelToken] = None, **kwargs) -> Generator[str, None, None]:
+        """
+        Streaming counterpart of think(): yields the answer as text deltas.
+        Stopping iteration early (or cancelling) stops the generation.
+        """
+        selected_model = model if model else self.main_model
+        print(f"Thinking (streamed) with model: {selected_model}")
+        stream = self._call_ollama_stream(selected_model, [{'role': 'user', 'content': prompt}],
+                                          cancel=cancel, priority=priority, **kwargs)
+        try:
+            for chunk in stream:
+                content = chunk['message']['content']
+                if content:
+                    yield content
+        finally:
+            stream.close()
+
+    def _cache_scope(self, model: str, request: Dict[str, Any], prompt: str, cache_text: Optional[str]):
+        """(scope, text to match) for a response-cache lookup; see think()."""
+        scope_parts = [model, self._answer_options(request)]
+        if cache_text and cache_text in prompt:
+            # Only requests built from the same template are compared
+            scope_parts.append(prompt.replace(cache_text, "\0"))
+            return request_key(*scope_parts), cache_text
+        return request_key(*scope_parts), prompt
+
+    def _generate_preemptible(self, model: str, messages: List[Dict], request: Dict[str, Any],
+                              preempt: CancelToken) -> Dict[str, Any]:
+        """
+        Non-streaming call made over a stream, so it can be abandoned between
+        tokens. Returns the final chunk with the full message filled in.
+        """
+        parts: List[str] = []
+        stream = self.client.chat(model=model, messages=messages, stream=True, **request)
+        try:
+            for chunk in stream:
+                if preempt.cancelled:
+                    raise Preempted(f"background call on {model} preempted")
+                parts.append(chunk['message']['content'])
+                if chunk.get('done'):
+                    return {**dict(chunk), 'message': {'role': 'assistant', 'content': "".join(parts)}}
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+        return {'message': {'role': 'assistant', 'content': "".join(parts)}}
+
+    def choose_action(self, model: str, messages: List[Dict], schema: Dict[str, Any],
+                      cancel: Optional[CancelToken] = None) -> Optional[Dict[str, Any]]:
+        """
+        Ask Ollama for an action with decoding constrained to `schema`
+        (structured outputs), so the reply is always valid JSON of the right shape.
+        """
+        if is_cancelled(cancel):
+            return None
+        started = time.perf_counter()
+        try:
+            with self.scheduler.slot(model, "interactive", cancel):
+                response = self.client.chat(model=model, messages=messages, format=schema,
+                                            **self._request_kwargs(model, {'options': {'temperature': 0}}))
+            self._record_stats(model, response, started=started, kind="structured")
+            parsed = json.loads(response['message']['content'])
+            return parsed if isinstance(parsed, dict) and "action" in parsed else None
+        except Exception as e:
+            print(f"Error getting structured action from {model}: {e}")
+            self._record_failure(model, "error", started, kind="structured")
+            return None
+
+    def analyze_image(self, image_path: str, prompt: str, cache: bool = True) -> str:
         """Analyze an image using the visual model (Qwen-VL)."""
-        if not os.path.exists(image_path):
-            return f"Error: Image path {image_path} does not exist."
-            
-        print(f"Analyzing image with model: {self.visual_model}")
+        return self.analyze_images([image_path], prompt, cache=cache)[0]
+
+    def analyze_images(self, image_paths: List[str], prompt: Union[str, List[str]], priority: str = "interactive",
+                       cache: bool = True) -> List[str]:
+        """
+        Analyze several images with the visual model, one answer per image.
+        Images are downsampled first, and answers are cached by image content
+        hash + prompt. Everything not cached runs back to back under a single
+        scheduler slot, so the visual model is loaded once for the whole set
+        instead of being swapped in and out between text calls.
+        prompt is either shared by every image or a list, one per image.
+        """
+        subsystem = caller_subsystem()
+        prompts = prompt if isinstance(prompt, list) else [prompt] * len(image_paths)
+        results: List[Optional[str]] = [None] * len(image_paths)
+        pending = []
+        first_index: Dict[str, int] = {}
+        repeats = [] # Same image and prompt twice in one batch: analyze once
+        for i, (image_path, image_prompt) in enumerate(zip(image_paths, prompts)):
+            if not os.path.exists(image_path):
+                results[i] = f"Error: Image path {image_path} does not exist."
+                continue
+            try:
+                digest, image = prepare_image(image_path)
+            except Exception as e:
+                results[i] = f"Error analyzing image: {e}"
+                continue
+            key = request_key(self.visual_model, digest, image_prompt)
+            cached = self.vision_cache.get(key, self.visual_model, image_prompt) if cache else None
+            if cached is not None:
+                self._record_cache_hit(self.visual_model, subsystem=subsystem, kind="vision", priority=priority)
+                results[i] = cached
+                continue
+            if key in first_index:
+                repeats.append((i, first_index[key]))
+                continue
+            first_index[key] = i
+            pending.append((i, image_prompt, image, key))
+
+        if not pending:
+            return results
+        print(f"Analyzing {len(pending)} image(s) with model: {self.visual_model} "
+              f"({len(image_paths) - len(pending)} cached)")
+        self.residency.refresh()
+        with self.scheduler.slot(self.visual_model, priority) as preempt:
+            for i, image_prompt, image, key in pending:
+                if preempt.cancelled:
+                    results[i] = "Error analyzing image: preempted by interactive work"
+                    continue
+                started = time.perf_counter()
+                try:
+                    response = self.client.chat(
+                        model=self.visual_model,
+                        messages=[{
+                            'role': 'user',
+                            'content': image_prompt,
+                            'images': [image]
+                        }],
+                        **self._request_kwargs(self.visual_model, {})
+                    )
+                    stats = self._record_stats(self.visual_model, response, started=started, subsystem=subsystem,
+                                               kind="vision", priority=priority)
+                    results[i] = response['message']['content']
+                    if cache:
+                        self.vision_cache.put(key, self.visual_model, image_prompt, results[i],
+                                              gpu_s=stats["load_s"] + stats["prefill_s"] + stats["eval_s"])
+                except Exception as e:
+                    print(f"Error calling visual model {self.visual_model}: {e}")
+                    self._record_failure(self.visual_model, "error", started, subsystem=subsystem, kind="vision",
+                                         priority=priority)
+                    results[i] = f"Error analyzing image: {e}"
+        for i, original in repeats:
+            results[i] = results[original]
+        return results
+
+    @property
+    def async_client(self) -> ollama.AsyncClient:
+        """Pooled async client for the server path (bound to the event loop it is first used in)."""
+        if self._async_client is None:
+            self._async_client = ollama.AsyncClient(host=OLLAMA_HOST, **_http_options())
+        return self._async_client
+
+    async def think_async(self, prompt: str, model: Optional[str] = None, cache: Any = False,
+                          priority: str = "interactive", cache_text: Optional[str] = None, **kwargs) -> str:
+        """
+        think() for the server's event loop: the same cache, scheduler queue,
+        coalescing and telemetry, awaiting Ollama instead of holding a thread.
+        """
+        selected_model = model if model else self.main_model
+        print(f"Thinking (async) with model: {selected_model}")
+        info = {"subsystem": kwargs.pop('subsystem', None) or caller_subsystem(), "kind": "think", "priority": priority}
+        messages = [{'role': 'user', 'content': prompt}]
+        request = self._request_kwargs(selected_model, kwargs)
+        key = request_key(selected_model, messages, self._answer_options(request))
+        mode = "exact" if cache is True else cache if cache in CACHE_MODES else None
+        vector = None
+        if mode:
+            scope, match_text = self._cache_scope(selected_model, request, prompt, cache_text)
+            # SQLite and the embedding call are short, but still off the event loop
+            cached, vector = await asyncio.to_thread(self.response_cache.lookup, key, scope, match_text, mode)
+            if cached is not None:
+                print(f"Response cache hit ({mode}) for {selected_model}")
+                self._record_cache_hit(selected_model, **info)
+                return cached
+
+        async def call():
+            started = time.perf_counter()
+            await asyncio.to_thread(self.residency.refresh)
+            try:
+                async with self.scheduler.async_slot(selected_model, priority) as preempt:
+                    response = await self._generate_async(selected_model, messages, request,
+                                                          preempt if priority == "background" else None)
+            except Preempted:
+                self._record_failure(selected_model, "preempted", started, **info)
+                raise
+            except asyncio.CancelledError:
+                self._record_failure(selected_model, "cancelled", started, **info)
+                raise
+            except Exception:
+                self._record_failure(selected_model, "error", started, **info)
+                raise
+            stats = self._record_stats(selected_model, response, started=started, **info)
+            if mode:
+                await asyncio.to_thread(self.response_cache.put, key, scope, match_text, response['message']['content'],
+                                        stats["load_s"] + stats["prefill_s"] + stats["eval_s"], mode, vector)
+            return response
+
         try:
-            response = ollama.chat(
-                model=self.visual_model,
-                messages=[{
-                    'role': 'user',
-                    'content': prompt,
-                    'images': [image_path]
-                }]
-            )
+            response = await self._single_flight.do_async(f"{key}:{priority}", call)
             return response['message']['content']
+        except Preempted:
+            print(f"Background call to {selected_model} preempted by interactive work")
+            raise
+        except Exception as e:
+            print(f"Error calling Ollama model {selected_model}: {e}")
+            raise
+
+    async def _generate_async(self, model: str, messages: List[Dict], request: Dict[str, Any],
+                              preempt: Optional[CancelToken]) -> Dict[str, Any]:
+        """One non-streaming answer; streamed under the hood when it must be preemptible."""
+        if preempt is None:
+            return await self.async_client.chat(model=model, messages=messages, **request)
+        parts: List[str] = []
+        stream = await self.async_client.chat(model=model, messages=messages, stream=True, **request)
+        try:
+            async for chunk in stream:
+                if preempt.cancelled:
+                    raise Preempted(f"background call on {model} preempted")
+                parts.append(chunk['message']['content'])
+                if chunk.get('done'):
+                    return {**dict(chunk), 'message': {'role': 'assistant', 'content': "".join(parts)}}
+        finally:
+            await stream.aclose()
+        return {'message': {'role': 'assistant', 'content': "".join(parts)}}
+
+    async def stream_async(self, model: str, messages: List[Dict], cancel: Optional[CancelToken] = None,
+                           priority: str = "interactive", **kwargs) -> AsyncGenerator[Dict[str, Any], None]:
+        """_call_ollama_stream() for the server's event loop, with the same queueing, sharing and telemetry."""
+        call = {"subsystem": kwargs.pop('subsystem', None) or caller_subsystem(), "kind": "stream", "priority": priority}
+        request = self._request_kwargs(model, kwargs)
+        prompt_tokens = sum(estimate_tokens(str(m.get('content') or "")) for m in messages)
+
+        async def start(abandon: CancelToken):
+            started = time.perf_counter()
+            first_token = None
+            sent = None
+            final = None
+            streamed = 0
+            outcome = "error"
+            await asyncio.to_thread(self.residency.refresh)
+            try:
+                async with self.scheduler.async_slot(model, priority, cancel=abandon) as preempt:
+                    if abandon.cancelled:
+                        raise Preempted(f"{priority} stream on {model} abandoned before it was sent")
+                    sent = time.perf_counter()
+                    upstream = await self.async_client.chat(model=model, messages=messages, stream=True, **request)
+                    try:
+                        async for chunk in upstream:
+                            if preempt.cancelled:
+                                raise Preempted(f"{priority} stream on {model} preempted")
+                            if first_token is None and chunk['message']['content']:
+                                first_token = time.perf_counter()
+                            if chunk.get('done'):
+                                final = chunk
+                            else:
+                                streamed += 1
+                            yield chunk
+                    finally:
+                        # Closing the response is what tells Ollama to stop decoding
+                        await upstream.aclose()
+                outcome = "ok"
+            except (GeneratorExit, asyncio.CancelledError):
+                # Abandoned by every subscriber; sorted out in _record_stream
+                outcome = "ok"
+                raise
+            except Preempted:
+                outcome = "preempted"
+                raise
+            except Exception:
+                outcome = "error"
+                raise
+            finally:
+                self._record_stream(model, outcome, started, sent, first_token, final, streamed, prompt_tokens,
+                                    abandoned=abandon.cancelled, cancelled=is_cancelled(cancel), **call)
+
+        stream = self._single_flight.stream_async(request_key(model, messages, self._answer_options(request), priority),
+                                                  start, cancel=cancel)
+        try:
+            async for chunk in stream:
+                if is_cancelled(cancel):
+                    print(f"Ollama stream for {model} cancelled.")
+                    return
+                yield chunk
         except Exception as e:
-            print(f"Error calling visual model {self.visual_model}: {e}")
-            return f"Error analyzing image: {e}"
+            print(f"Error calling Ollama model {model}: {e}")
+            raise
+        finally:
+            await stream.aclose()
+
+    async def preload_async(self, model: Optional[str] = None) -> None:
+        """Async preload, used by the server at startup."""
+        selected_model = model if model else self.main_model
+        try:
+            await self.async_client.chat(model=selected_model, messages=[], **self._request_kwargs(selected_model, {}))
+        except Exception as e:
+            print(f"Error preloading Ollama model {selected_model}: {e}")
+
+    def _model_role(self, model: str) -> str:
+        if model == self.main_model:
+            return "main"
+        if model in (self.coding_model, self.coding_model_fallback):
+            return "coding"
+        if model == self.visual_model:
+            return "visual"
+        if model in (FAST_PATH_MODEL, ROUTER_MODEL):
+            return "fast"
+        return "other"
+
+    def _request_kwargs(self, model: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Fill in residency and context options so every call to the same model
+        looks identical to Ollama. Identical options keep the model loaded and
+        let it reuse the KV cache for a shared prompt prefix.
+        """
+        request = dict(kwargs)
+        request.setdefault('keep_alive', self.residency.keep_alive(model, self._model_role(model), self._pinned_models()))
+        options = dict(request.get('options') or {})
+        options.setdefault('num_ctx', OLLAMA_NUM_CTX)
+        request['options'] = options
+        return request
+
+    def _record_stats(self, model: str, response: Any, started: Optional[float] = None,
+                      first_token: Optional[float] = None, subsystem: Optional[str] = None,
+                      kind: str = "chat", priority: str = "interactive", estimated: bool = False) -> Dict[str, Any]:
+        """
+        Record Ollama's load, prefill and eval timings for a finished call,
+        plus wall time and time-to-first-token (streamed calls only) measured
+        from `started` (time.perf_counter()). The call also goes to the
+        telemetry table, attributed to `subsystem` (the caller if omitted).
+        estimated marks timings reconstructed on the client side.
+        """
+        ns = 1e9
+        now = time.perf_counter()
+        stats = {
+            "model": model,
+            "timestamp": time.time(),
+            "load_s": (response.get('load_duration') or 0) / ns,
+            "prompt_tokens": response.get('prompt_eval_count') or 0,
+            "prefill_s": (response.get('prompt_eval_duration') or 0) / ns,
+            "eval_tokens": response.get('eval_count') or 0,
+            "eval_s": (response.get('eval_duration') or 0) / ns,
+            "ttft_s": first_token - started if started is not None and first_token is not None else None,
+            "wall_s": now - started if started is not None else None,
+        }
+        stats["tokens_per_s"] = stats["eval_tokens"] / stats["eval_s"] if stats["eval_s"] else 0.0
+        self.call_stats.append(stats)
+        self.residency.note_call(model, stats["load_s"])
+        self.telemetry.record(model=model, subsystem=subsystem or caller_subsystem(), kind=kind, priority=priority,
+                              outcome="ok", estimated=int(estimated),
+                              **{k: v for k, v in stats.items() if k not in ("model", "timestamp", "tokens_per_s")})
+        ttft = f" | ttft {stats['ttft_s']:.2f}s" if stats["ttft_s"] is not None else ""
+        print(f"Ollama {model}: load {stats['load_s']:.2f}s | prefill {stats['prompt_tokens']} tok in "
+              f"{stats['prefill_s']:.2f}s | eval {stats['eval_tokens']} tok in {stats['eval_s']:.2f}s "
+              f"({stats['tokens_per_s']:.1f} tok/s){ttft}{' (estimated)' if estimated else ''}")
+        return stats
+
+    def _record_stream(self, model: str, outcome: str, started: float, sent: Optional[float],
+                       first_token: Optional[float], final: Optional[Dict[str, Any]], streamed: int,
+                       prompt_tokens: int, abandoned: bool, cancelled: bool, **call) -> None:
+        """
+        Telemetry for one streamed generation, however it ended. `sent` is
+        when the request left the queue for Ollama; prompt_tokens is a
+        client-side estimate, used only when Ollama's counts never arrived.
+        """
+        if abandoned and final is None:
+            # The agent stops reading at an action's closing brace; that call did its job.
+            # A user cancel, or a stop before any output, is a cancelled call.
+            outcome = "cancelled" if cancelled or first_token is None else "ok"
+        if outcome != "ok":
+            self._record_failure(model, outcome, started, **call)
+        elif final is not None:
+            self._record_stats(model, final, started=started, first_token=first_token, **call)
+        else:
+            # Stopped early, so no server timings. Sent to first token is load plus prefill, and
+            # the streamed chunks are about one token each.
+            ns = 1e9
+            self._record_stats(model, {
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int((first_token - (sent or started)) * ns),
+                "eval_count": streamed,
+                "eval_duration": int((time.perf_counter() - first_token) * ns),
+            }, started=started, first_token=first_token, estimated=True, **call)
+
+    def _record_failure(self, model: str, outcome: str, started: Optional[float], subsystem: Optional[str] = None,
+                        kind: str = "chat", priority: str = "interactive") -> None:
+        """Telemetry for a call that produced no timings (error, cancel, preemption)."""
+        self.telemetry.record(model=model, subsystem=subsystem or caller_subsystem(), kind=kind, priority=priority,
+                              outcome=outcome, wall_s=time.perf_counter() - started if started is not None else 0.0)
+
+    def _record_cache_hit(self, model: str, subsystem: Optional[str] = None, kind: str = "chat",
+                          priority: str = "interactive") -> None:
+        """Telemetry for a request answered from a cache without reaching the model."""
+        self.telemetry.record(model=model, subsystem=subsystem or caller_subsystem(), kind=kind, priority=priority,
+                              outcome="cache_hit", wall_s=0.0)
+
+    def preload(self, model: Optional[str] = None) -> None:
+        """Load a model ahead of time so the first real call skips the load."""
+        selected_model = model if model else self.main_model
+        try:
+            self.client.chat(model=selected_model, messages=[], **self._request_kwargs(selected_model, {}))
+        except Exception as e:
+            print(f"Error preloading Ollama model {selected_model}: {e}")
+
+    def release(self, model: str) -> None:
+        """Ask Ollama to unload a model right away."""
+        try:
+            self.client.chat(model=model, messages=[], keep_alive=0)
+        except Exception as e:
+            print(f"Error releasing Ollama model {model}: {e}")
+
+    def get_call_stats(self, limit: int = 20) -> List[Dict[str, Any]]:
+        return list(self.call_stats)[-limit:]
+
+    def get_single_flight_stats(self) -> Dict[str, int]:
+        return dict(self._single_flight.stats)
+
+    def _pinned_models(self) -> List[str]:
+        return [self.main_model, FAST_PATH_MODEL, ROUTER_MODEL]
+
+    @staticmethod
+    def _answer_options(request: Dict[str, Any]) -> Dict[str, Any]:
+        """Request options that can change the answer (keep_alive only changes residency)."""
+        return {k: v for k, v in request.items() if k != 'keep_alive'}
+
+    def get_residency_report(self) -> Dict[str, Any]:
+        return self.residency.get_report(self._pinned_models())
+
+    def get_telemetry(self, hours: float = 24) -> Dict[str, Any]:
+        return self.telemetry.aggregates(hours)
+
+    def get_scheduler_stats(self) -> Dict[str, Any]:
+        return self.scheduler.get_stats()
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        return self.response_cache.get_stats()
+
+    def _embed(self, text: str) -> Optional[List[float]]:
+        """Embedding used for semantic response-cache lookups."""
+        response = self.client.embed(model=RESPONSE_CACHE_EMBED_MODEL, input=text,
+                                     keep_alive=MODEL_KEEP_ALIVE["fast"])
+        embeddings = response.get('embeddings') or []
+        return list(embeddings[0]) if embeddings else None
 
     def switch_model(self, task_type: str, new_model: str) -> None:
         if task_type == 'main':
@@ -0,0 +1,45 @@
+"""
+cancellation.py
+
+Cooperative cancellation for Timmy AI.
+A CancelToken is shared between the server, the agent loop, Brain streaming,
+OmniKernel and the Council. Each of them checks it at safe points and stops
+early, so an abandoned run frees the GPU instead of running to completion.
+Thread-safe, since the agent loop runs in a worker thread.
+"""
+
+import threading
+
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def cancel(self):
+        with self._lock:
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Cancel callback failed: {e}")
+
+    def on_cancel(self, callback):
+        """Run callback once when the token is cancelled (right away if it already is)."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+def is_cancelled(cancel) -> bool:
+    """True when an optional token has been cancelled."""
+    return cancel is not None and cancel.cancelled
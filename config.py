@@ -29,6 +29,103 @@ AVAILABLE_MODELS: List[str] = [
     "qwen3-vl:32b"
 ]
 
+# Fast-path routing — small model for trivial replies and for routing
+# decisions the local classifier isn't sure about
+FAST_PATH_MODEL = "qwen2.5-coder:7b"
+ROUTER_MODEL = "qwen2.5-coder:7b"
+ROUTER_MIN_SAMPLES = 30  # Learned routes kick in after this many handled messages
+ROUTER_CACHE_SIZE = 128
+ROUTER_CACHE_TTL = 600  # seconds
+ROUTER_SAVE_DELAY_S = 10  # Learned counts are written at most this often
+
+# Mock Ollama (mock_ollama.py) — scripted replies with configurable speed, no GPU needed.
+# TIMMY_MOCK_OLLAMA=1 points Brain at it.
+MOCK_OLLAMA_PORT = 11435
+MOCK_OLLAMA_FIRST_TOKEN_S = 0.2
+MOCK_OLLAMA_TOKENS_PER_S = 40.0
+MOCK_OLLAMA_LOAD_S = 0.0  # Simulated load time for a cold model
+USE_MOCK_OLLAMA = os.environ.get("TIMMY_MOCK_OLLAMA") == "1"
+
+# Ollama connection — one pooled client per process
+OLLAMA_HOST = f"http://127.0.0.1:{MOCK_OLLAMA_PORT}" if USE_MOCK_OLLAMA else os.environ.get("OLLAMA_HOST")  # None = library default (localhost:11434)
+OLLAMA_MAX_CONNECTIONS = 4
+OLLAMA_CONNECT_TIMEOUT = 5.0
+OLLAMA_READ_TIMEOUT = 600.0  # Long enough for a cold 30B load plus a full answer
+OLLAMA_POOL_TIMEOUT = 120.0  # Longest wait for a free pooled socket; the scheduler keeps this rare
+
+# LLM Scheduler — concurrent generations per model. Interactive work defers
+# queued background jobs and preempts running ones.
+LLM_DEFAULT_CONCURRENCY = 1
+LLM_MODEL_CONCURRENCY = {
+    "qwen2.5-coder:7b": 2,
+}
+LLM_PREEMPT_BACKGROUND = True
+LLM_AFFINITY_MAX_DEFER_S = 5.0  # Longest a call waits for loaded-model work to go first
+
+# Model Residency — how long Ollama keeps each role's model loaded after a call.
+# Keeping the main/coding models hot lets Ollama reuse the cached prompt prefix
+# across agent iterations instead of reloading and re-prefilling.
+MODEL_KEEP_ALIVE = {
+    "main": "30m",
+    "coding": "30m",
+    "visual": "5m",
+    "fast": "30m",  # Small fast-path/router model
+    "other": "2m",  # Council members and ad-hoc models
+}
+# Residency manager — which models stay hot, given how recently they were used
+RESIDENCY_MEMORY_BUDGET_GB = 96  # Unified memory Ollama may fill (M4 Max, 128GB)
+RESIDENCY_REFRESH_S = 5  # How often `ollama ps` is re-read
+RESIDENCY_USAGE_HALF_LIFE_S = 1800
+RESIDENCY_LOAD_THRESHOLD_S = 0.5  # load_duration above this counts as a (re)load
+RESIDENCY_HOT_KEEP_ALIVE = "15m"  # For hot Council/ad-hoc models
+# Fixed context size: changing num_ctx between calls forces Ollama to reload the model
+OLLAMA_NUM_CTX = 16384
+
+# Model Router — candidate models per task type, best quality first. The first
+# one predicted to answer within the task's latency SLO wins.
+MODEL_ROUTES = {
+    "chat": [DEFAULT_MAIN_MODEL, "gpt-oss:20b", "qwen2.5-coder:7b"],
+    "tool": [DEFAULT_MAIN_MODEL, "gpt-oss:20b"],
+    "code": [DEFAULT_CODING_MODEL, CODING_MODEL_FALLBACK, "qwen2.5-coder:32b", "qwen2.5-coder:7b"],
+    "reasoning": [REASONING_MODEL, DEFAULT_MAIN_MODEL],
+}
+MODEL_ROUTE_SLO_S = {"chat": 20, "tool": 30, "code": 60, "reasoning": 120}  # Seconds per response
+MODEL_ROUTE_EXPECTED_TOKENS = {"chat": 250, "tool": 200, "code": 600, "reasoning": 1200}
+MODEL_ROUTE_MIN_SLO_RATE = 0.7  # Skip a model whose recent routed calls met the SLO less often than this
+MODEL_ROUTE_MIN_SAMPLES = 5  # Routed outcomes needed before its SLO rate counts
+MODEL_ROUTE_DEFAULT_TOKENS_PER_S = 20.0  # Until a model has been measured
+MODEL_ROUTE_LOAD_GB_PER_S = 2.0  # Cold-load estimate before a load has been measured
+MODEL_ROUTE_STATS_TTL_S = 60
+
+# Context Packing — prompt token budget (system prompt + history) per model.
+# The rest of num_ctx is left for the model's answer.
+DEFAULT_CONTEXT_TOKEN_BUDGET = OLLAMA_NUM_CTX - 4096
+CONTEXT_TOKEN_BUDGETS = {
+    "qwen2.5-coder:7b": 6144,
+    "deepseek-coder:6.7b": 6144,
+}
+CONTEXT_KEEP_RECENT = 6  # Newest turns kept verbatim
+CONTEXT_HISTORY_LIMIT = 80  # Most turns the packer looks at (older ones are rehydrated from disk)
+
+# Embeddings — one model for the whole process, loaded on first use or warmed
+# in the background when the server starts
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_WARM_UP_ON_START = True
+EMBEDDING_CACHE_MAX_ENTRIES = 50000  # 384-dim float32 rows: ~75MB
+
+# Memory ingestion — long documents are split into overlapping passages and
+# embedded in batches (all-MiniLM-L6-v2 on CPU peaks around 32 per batch)
+MEMORY_CHUNK_CHARS = 1000
+MEMORY_CHUNK_OVERLAP = 200
+MEMORY_EMBED_BATCH_SIZE = 32
+# Near-duplicate check at ingest: an entry this similar (cosine) to an existing
+# one isn't stored. Conversation turns repeat legitimately, so they're exempt.
+MEMORY_DEDUP_SIMILARITY = 0.97
+MEMORY_DEDUP_COLLECTIONS = ("long_term_knowledge", "episodic_memory", "semantic_knowledge")
+
+# Working conversation — turns held in RAM before spilling to memory.db
+CONVERSATION_RING_SIZE = 40
+
 # Paths — dynamically resolved from this file's location
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 DATA_PATH = os.path.join(PROJECT_ROOT, "data")
@@ -36,12 +133,51 @@ MEMORY_PATH = os.path.join(DATA_PATH, "memory")
 LOGS_PATH = os.path.join(DATA_PATH, "logs")
 KNOWLEDGE_PATH = os.path.join(DATA_PATH, "knowledge")
 SKILLS_PATH = os.path.join(PROJECT_ROOT, "skills")
+BLOBS_PATH = os.path.join(DATA_PATH, "blobs")
+MOCK_OLLAMA_SCRIPTS = os.path.join(DATA_PATH, "mock_ollama_scripts.json")
+VISION_PATH = os.path.join(DATA_PATH, "vision")
+EMBEDDING_CACHE_PATH = os.path.join(DATA_PATH, "embeddings")
 
 # User-specific paths (MacBook Pro M4 Max)
 # Timmy's Stuff is on the desktop for project files
 USER_HOME = os.path.expanduser("~")
 TIMS_STUFF_PATH = os.path.join(USER_HOME, "Desktop", "tim's Stuff")
 
+# Vision — images are downsampled before analysis, and answers are cached by
+# image content hash + prompt
+VISION_MAX_IMAGE_SIDE = 1280  # px; more only adds prefill for the VL model
+VISION_JPEG_QUALITY = 85
+VISION_CACHE_TTL = 30 * 24 * 3600
+VISION_CACHE_MAX_ENTRIES = 5000
+VISION_RESIZED_MAX_BYTES = 256 * 1024 * 1024  # Downsampled copies in data/vision; least recently used go first
+
+# Telemetry — every Ollama call is logged to data/telemetry.db by a background writer
+TELEMETRY_QUEUE_SIZE = 10000  # Rows are dropped, never waited on, beyond this
+TELEMETRY_FLUSH_S = 1.0
+
+# Response Cache — opt-in per call via brain.think(..., cache="exact" | "semantic")
+RESPONSE_CACHE_TTL = 7 * 24 * 3600  # seconds
+RESPONSE_CACHE_MAX_ENTRIES = 2000
+RESPONSE_CACHE_SIMILARITY = 0.95  # Cosine similarity for a semantic hit
+RESPONSE_CACHE_EMBED_MODEL = "nomic-embed-text"
+
+# Structured outputs — re-decode malformed actions with a JSON schema built from
+# the action registry instead of letting them fall through as plain text
+STRUCTURED_ACTION_REPAIR = True
+# A '{' in streamed output held back longer than this without closing is released as text
+STREAM_ACTION_MAX_CHARS = 64 * 1024
+
+# Blob Store — tool outputs larger than this go out-of-band behind a handle
+BLOB_INLINE_LIMIT = 4000  # chars
+BLOB_PREVIEW_CHARS = 1200
+BLOB_PAGE_MAX_LINES = 200
+BLOB_PAGE_MAX_CHARS = 8000
+BLOB_STORE_MAX_BYTES = 512 * 1024 * 1024
+
+# Omni-Kernel — parallel execution of batched actions
+KERNEL_MAX_PARALLEL_ACTIONS = 4
+KERNEL_MAX_BATCH_SIZE = 8
+
 # Loop Detection
 LOOP_DETECTION_WINDOW = 5
 LOOP_DETECTION_THRESHOLD = 3
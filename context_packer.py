@@ -0,0 +1,125 @@
+"""
+context_packer.py
+
+Token-budgeted context packing for Timmy AI.
+Fits the conversation into a per-model prompt budget: the newest turns stay
+verbatim, older tool results shrink to one-line summaries, and anything that
+still does not fit is folded into a rolling summary at the front.
+"""
+
+import json
+from typing import Dict, Any, List, Optional
+from config import CONTEXT_TOKEN_BUDGETS, DEFAULT_CONTEXT_TOKEN_BUDGET, CONTEXT_KEEP_RECENT
+
+TOOL_RESULT_PREFIX = "TOOL_RESULT: "
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 chars per token for English and code)."""
+    return len(text) // 4 + 1
+
+
+def _clip(text: str, max_tokens: int) -> str:
+    """Keep the head and tail of a long text within roughly max_tokens."""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    half = max_chars // 2
+    return f"{text[:half]}\n...[{len(text) - max_chars} chars trimmed]...\n{text[-half:]}"
+
+
+class ContextPacker:
+    def __init__(self, keep_recent: int = CONTEXT_KEEP_RECENT, max_message_tokens: int = 2000,
+                 old_message_tokens: int = 300, summary_share: float = 0.15):
+        self.keep_recent = keep_recent
+        self.max_message_tokens = max_message_tokens
+        self.old_message_tokens = old_message_tokens
+        self.summary_share = summary_share
+
+    def budget_for(self, model: str) -> int:
+        return CONTEXT_TOKEN_BUDGETS.get(model, DEFAULT_CONTEXT_TOKEN_BUDGET)
+
+    def count(self, messages: List[Dict[str, Any]]) -> int:
+        return sum(estimate_tokens(m.get("content", "")) + 4 for m in messages)
+
+    def compact_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Cap a recent message so no single turn can blow up prefill."""
+        content = message.get("content", "")
+        if estimate_tokens(content) <= self.max_message_tokens:
+            return message
+        return {**message, "content": _clip(content, self.max_message_tokens)}
+
+    def summarize_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Shrink an older message; tool results become a one-line summary."""
+        content = message.get("content", "")
+        if content.startswith(TOOL_RESULT_PREFIX):
+            return {**message, "content": self._summarize_tool_result(content)}
+        if estimate_tokens(content) <= self.old_message_tokens:
+            return message
+        return {**message, "content": _clip(content, self.old_message_tokens)}
+
+    def _summarize_tool_result(self, content: str) -> str:
+        body = content[len(TOOL_RESULT_PREFIX):]
+        status = ""
+        try:
+            parsed = json.loads(body)
+            if isinstance(parsed, dict):
+                status = f" status={parsed.get('status', 'n/a')} keys={','.join(list(parsed)[:6])}"
+                if parsed.get("blob"):
+                    # Keep the handle so the model can still page the full output
+                    status += f" blob={parsed['blob']}"
+        except ValueError:
+            pass
+        preview = " ".join(body[:200].split())
+        return f"{TOOL_RESULT_PREFIX}[summarized: {len(body)} chars{status}] {preview}..."
+
+    def pack(self, messages: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+        """
+        Return a copy of messages that fits in budget tokens.
+        Walks newest to oldest: the last keep_recent turns are kept (capped),
+        older turns are summarized, and whatever overflows is folded into a
+        single rolling-summary message placed first.
+        """
+        packed: List[Dict[str, Any]] = []
+        used = 0
+        summary_budget = int(budget * self.summary_share)
+        cut = 0
+
+        for i in range(len(messages) - 1, -1, -1):
+            recent = len(messages) - i <= self.keep_recent
+            message = self.compact_message(messages[i]) if recent else self.summarize_message(messages[i])
+            cost = self.count([message])
+            # Always keep the newest turn, even if it alone exceeds the budget
+            if packed and used + cost > budget - summary_budget:
+                cut = i + 1
+                break
+            packed.append(message)
+            used += cost
+
+        packed.reverse()
+        summary = self._rolling_summary(messages[:cut], summary_budget)
+        if summary:
+            packed.insert(0, summary)
+        return packed
+
+    def _rolling_summary(self, folded: List[Dict[str, Any]], budget: int) -> Optional[Dict[str, Any]]:
+        if not folded:
+            return None
+        lines: List[str] = []
+        used = 0
+        # Newest folded turns matter most, so fill from the end
+        for message in reversed(folded):
+            content = message.get("content", "")
+            if content.startswith(TOOL_RESULT_PREFIX):
+                line = f"- tool result ({len(content)} chars)"
+            else:
+                line = f"- {message.get('role', 'user')}: {' '.join(content[:160].split())}"
+            if used + estimate_tokens(line) > budget:
+                break
+            lines.append(line)
+            used += estimate_tokens(line)
+        lines.reverse()
+        omitted = len(folded) - len(lines)
+        header = "EARLIER CONVERSATION (summarized"
+        header += f", {omitted} older turns omitted):" if omitted else "):"
+        return {"role": "system", "content": header + "\n" + "\n".join(lines)}
@@ -0,0 +1,91 @@
+"""
+conversation_store.py
+
+Bounded working conversation for Timmy AI.
+Keeps the newest turns in a fixed-size in-memory ring. Older turns are
+spilled to the `messages` table in memory.db (kind='context') and read back
+on demand, so resident memory stays flat no matter how long the server runs.
+Spilled rows from earlier processes are deleted at startup.
+Positions are absolute for the life of the process, so callers can keep
+"everything since position N" cursors across evictions.
+"""
+
+import sqlite3
+import threading
+import uuid
+from collections import deque
+from typing import Dict, Any, List
+from config import CONVERSATION_RING_SIZE
+
+
+class ConversationStore:
+    def __init__(self, db_file: str, max_in_memory: int = CONVERSATION_RING_SIZE):
+        self.db_file = db_file
+        self.max_in_memory = max_in_memory
+        self.session = uuid.uuid4().hex # Spilled rows are scoped to this process
+        self._ring: deque = deque() # (position, message)
+        self._total = 0
+        self._lock = threading.Lock()
+        self._purge_stale_sessions()
+
+    def __len__(self) -> int:
+        """Total turns appended this session, including spilled ones."""
+        return self._total
+
+    def append(self, message: Dict[str, Any]):
+        with self._lock:
+            self._ring.append((self._total, message))
+            self._total += 1
+            evicted = self._ring.popleft() if len(self._ring) > self.max_in_memory else None
+        if evicted:
+            self._spill(*evicted)
+
+    def since(self, position: int) -> List[Dict[str, Any]]:
+        """All turns from an absolute position onward, rehydrating spilled ones."""
+        with self._lock:
+            ring = list(self._ring)
+        first_in_memory = ring[0][0] if ring else self._total
+        older = self._load(position, first_in_memory) if position < first_in_memory else []
+        return older + [m for pos, m in ring if pos >= position]
+
+    def recent(self, n: int) -> List[Dict[str, Any]]:
+        """The newest n turns."""
+        return self.since(max(0, self._total - n))
+
+    def _spill(self, position: int, message: Dict[str, Any]):
+        try:
+            conn = sqlite3.connect(self.db_file)
+            conn.execute(
+                "INSERT INTO messages (role, content, kind, session, seq) VALUES (?, ?, 'context', ?, ?)",
+                (message.get("role"), message.get("content"), self.session, position)
+            )
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            print(f"Error spilling conversation turn {position}: {e}")
+
+    def _purge_stale_sessions(self):
+        """Spilled rows from earlier processes are unreachable (the session key is new each run), so drop them."""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            deleted = conn.execute("DELETE FROM messages WHERE kind = 'context' AND session != ?", (self.session,)).rowcount
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            print(f"Error purging spilled conversation: {e}")
+            return
+        if deleted:
+            print(f"Dropped {deleted} spilled turns from earlier sessions")
+
+    def _load(self, start: int, end: int) -> List[Dict[str, Any]]:
+        try:
+            conn = sqlite3.connect(self.db_file)
+            rows = conn.execute(
+                "SELECT role, content FROM messages WHERE kind = 'context' AND session = ? AND seq >= ? AND seq < ? ORDER BY seq",
+                (self.session, start, end)
+            ).fetchall()
+            conn.close()
+        except Exception as e:
+            print(f"Error loading spilled conversation: {e}")
+            return []
+        return [{"role": r, "content": c} for r, c in rows]
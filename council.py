@@ -11,9 +11,9 @@ Ollama model list.
 import json
 import time
 import re
-import subprocess
 from typing import List, Dict, Any, Optional, Generator
 from brain import Brain
+from cancellation import CancelToken, is_cancelled
 from tools.web_search import WebSearchTool
 from config import AVAILABLE_MODELS
 
@@ -29,19 +29,18 @@ class Council:
     def _scan_ollama_models(self) -> List[str]:
         """Scan local Ollama models to keep the council list updated."""
         try:
-            result = subprocess.run(["ollama", "list"], capture_output=True, text=True)
-            if result.returncode == 0:
-                # Parse the output to get model names
-                lines = result.stdout.strip().split('\n')[1:] # Skip header
-                models = [line.split()[0] for line in lines if line]
+            # Through the API rather than the `ollama` CLI, so it follows OLLAMA_HOST (and the mock server)
+            response = self.brain.client.list()
+            models = [m.get('model') or m.get('name') for m in response.get('models') or []]
+            if models:
                 print(f"Council scanned {len(models)} models: {models}")
                 return models
         except Exception as e:
             print(f"Error scanning Ollama models: {e}")
         return AVAILABLE_MODELS
 
-    def convene(self, problem: str) -> Generator[Dict[str, Any], None, None]:
-        """Convene the council to debate a complex problem."""
+    def convene(self, problem: str, cancel: Optional[CancelToken] = None) -> Generator[Dict[str, Any], None, None]:
+        """Convene the council to debate a complex problem. Stops between speakers once `cancel` is cancelled."""
         yield {"type": "council_status", "text": f"Council convened for: {problem}"}
         
         self.debate_history = [{"role": "system", "content": f"The problem to solve is: {problem}. Debate among yourselves to find the best solution. You can propose web searches if needed."}]
@@ -49,11 +48,20 @@ class Council:
         # Select a subset of models for the debate to avoid crashing
         # We'll pick the top 3-4 models if available
         debate_models = self.active_models[:4]
+        # Models already in memory speak first, and the order flips every round so the
+        # last speaker (still loaded) opens the next one: one fewer model load per round.
+        self.brain.residency.refresh(force=True)
+        debate_models.sort(key=lambda m: not self.brain.residency.is_resident(m))
         
         for round_num in range(1, self.max_rounds + 1):
             yield {"type": "council_status", "text": f"Debate Round {round_num}..."}
+            if round_num > 1:
+                debate_models.reverse()
             
             for model in debate_models:
+                if is_cancelled(cancel):
+                    yield {"type": "council_status", "text": "Council adjourned (cancelled)."}
+                    return
                 yield {"type": "council_status", "text": f"{model} is speaking..."}
                 
                 # Build the prompt for the current model
@@ -70,7 +78,11 @@ class Council:
                 """
                 
                 try:
-                    response = self.brain.think(prompt, model=model)
+                    # Stream the speaker token by token; the full text is still needed for history and SEARCH
+                    response = ""
+                    for delta in self.brain.think_stream(prompt, model=model, priority="council", cancel=cancel):
+                        response += delta
+                        yield {"type": "council_debate_chunk", "model": model, "text": delta}
                     self.debate_history.append({"role": model, "content": response})
                     
                     # Check for search proposal
@@ -81,8 +93,6 @@ class Council:
                         search_result = self.web_search.execute(query)
                         self.debate_history.append({"role": "system", "content": f"Search result for '{query}': {json.dumps(search_result)}"})
                     
-                    yield {"type": "council_debate_chunk", "model": model, "text": response}
-                    
                 except Exception as e:
                     yield {"type": "council_error", "text": f"Error with model {model}: {e}"}
             
@@ -91,6 +101,9 @@ class Council:
                 yield {"type": "council_status", "text": "Consensus reached."}
                 break
                 
+        if is_cancelled(cancel):
+            return
+
         # Final summary by Timmy
         yield {"type": "council_status", "text": "Timmy is summarizing the council's findings..."}
         summary_prompt = f"""
@@ -98,8 +111,8 @@ class Council:
         Debate History:
         {self._format_history()}
         """
-        summary = self.brain.think(summary_prompt)
-        yield {"type": "council_summary", "text": summary}
+        for delta in self.brain.think_stream(summary_prompt, priority="council", cancel=cancel):
+            yield {"type": "council_summary", "text": delta}
 
     def _format_history(self) -> str:
         """Format the debate history for the prompt."""
@@ -23,6 +23,7 @@ class DreamJournal:
     def __init__(self, brain):
         self.brain = brain
         self.journal: List[Dict[str, Any]] = self._load_journal()
+        self.version = 0 # Bumped on every change so cached prompt sections can refresh
 
     def _load_journal(self) -> List[Dict[str, Any]]:
         try:
@@ -50,6 +51,7 @@ class DreamJournal:
             "vibe": random.choice(["curious", "focused", "chill", "determined"])
         }
         self.journal.append(entry)
+        self.version += 1
         self._save_journal()
 
     def get_latest_entries(self, n: int = 5) -> str:
@@ -87,7 +89,8 @@ class MoralCompass:
     def debate_ethics(self, request: str) -> str:
         """Debate the ethics of a request."""
         prompt = f"You are Timmy's Moral-Compass. Debate the ethics of this request from Ben: {request}. Be thoughtful and human-like."
-        return self.brain.think(prompt)
+        # Match on the request alone; the template would make every request look alike
+        return self.brain.think(prompt, cache="semantic", cache_text=request)
 
 class HumorSynthesis:
     def __init__(self, brain):
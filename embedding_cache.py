@@ -0,0 +1,141 @@
+"""
+embedding_cache.py
+
+Persistent cache of text embeddings, keyed by a hash of model and text.
+The same strings get embedded again and again: repeated memory queries,
+re-learned pages, duplicate notes. Vectors are stored as fixed-width float32
+rows in a memory-mapped file (data/embeddings/vectors.f32), so a hit is a
+dict lookup and one struct unpack. A small SQLite index maps each hash to its
+row and keeps the LRU order across restarts. The cache holds at most
+max_entries rows; the least recently used row is overwritten when it is full.
+"""
+
+import hashlib
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Sequence
+from config import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES
+
+
+def text_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()[:32]
+
+
+class EmbeddingCache:
+    def __init__(self, model: str, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.model = model
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._slots: "OrderedDict[str, int]" = OrderedDict() # key -> row, least recently used first
+        self._free: List[int] = [] # Unused rows, lowest last
+        self._touched: Dict[str, float] = {} # Hits not yet written to the index
+        self._dim: Optional[int] = None
+        self._mm: Optional[mmap.mmap] = None
+        self._file = None
+        self.stats: Dict[str, Any] = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        os.makedirs(self.path, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(self.path, "index.db"), check_same_thread=False)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                slot INTEGER NOT NULL UNIQUE,
+                last_used REAL NOT NULL
+            )
+        ''')
+        self._conn.commit()
+        meta = dict(self._conn.execute('SELECT name, value FROM meta').fetchall())
+        if meta.get("model") not in (None, model):
+            # Vectors from another model are useless (and may be another width)
+            self._conn.execute('DELETE FROM entries')
+            self._conn.execute('DELETE FROM meta')
+            self._conn.commit()
+        elif meta.get("dim"):
+            self._open(int(meta["dim"]))
+            for key, slot in self._conn.execute('SELECT key, slot FROM entries ORDER BY last_used').fetchall():
+                if slot < self.max_entries:
+                    self._slots[key] = slot
+        used = set(self._slots.values())
+        self._free = [slot for slot in range(self.max_entries - 1, -1, -1) if slot not in used]
+
+    def _open(self, dim: int):
+        """Map the vectors file, sized for max_entries rows of dim float32s."""
+        self._dim = dim
+        size = self.max_entries * dim * 4
+        vectors = os.path.join(self.path, "vectors.f32")
+        self._file = open(vectors, "r+b" if os.path.exists(vectors) else "w+b")
+        if os.path.getsize(vectors) < size:
+            self._file.truncate(size) # Sparse on APFS/ext4: only written rows take disk space
+        self._mm = mmap.mmap(self._file.fileno(), size)
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Cached vector for each text, or None where it isn't cached."""
+        results: List[Optional[List[float]]] = []
+        now = time.time()
+        with self._lock:
+            for text in texts:
+                key = text_key(self.model, text)
+                slot = self._slots.get(key)
+                if slot is None or self._mm is None:
+                    self.stats["misses"] += 1
+                    results.append(None)
+                    continue
+                self._slots.move_to_end(key)
+                self._touched[key] = now
+                self.stats["hits"] += 1
+                results.append(list(struct.unpack_from(f"{self._dim}f", self._mm, slot * self._dim * 4)))
+        return results
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """Store vectors for texts, evicting the least recently used rows when full."""
+        if not texts:
+            return
+        now = time.time()
+        with self._lock:
+            if self._mm is None:
+                self._open(len(vectors[0]))
+                self._conn.executemany('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)',
+                                       [("model", self.model), ("dim", str(self._dim))])
+            rows = []
+            evicted = []
+            for text, vector in zip(texts, vectors):
+                if len(vector) != self._dim:
+                    continue
+                key = text_key(self.model, text)
+                slot = self._slots.pop(key, None)
+                if slot is None:
+                    if self._free:
+                        slot = self._free.pop()
+                    else:
+                        old_key, slot = self._slots.popitem(last=False)
+                        evicted.append((old_key,))
+                        self.stats["evictions"] += 1
+                self._slots[key] = slot
+                struct.pack_into(f"{self._dim}f", self._mm, slot * self._dim * 4, *vector)
+                rows.append((key, slot, now))
+                self.stats["stores"] += 1
+            self._conn.executemany('DELETE FROM entries WHERE key = ?', evicted)
+            self._conn.executemany('INSERT OR REPLACE INTO entries (key, slot, last_used) VALUES (?, ?, ?)', rows)
+            # Persist the LRU order from hits along with the write
+            self._conn.executemany('UPDATE entries SET last_used = ? WHERE key = ?',
+                                   [(t, k) for k, t in self._touched.items()])
+            self._touched.clear()
+            self._conn.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._slots),
+                "max_entries": self.max_entries,
+                "dim": self._dim,
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,103 @@
+"""
+embedding_service.py
+
+One embedding model and one Chroma client for the whole process.
+Every Memory used to build its own SentenceTransformer and PersistentClient,
+and skills/__init__.py creates a NoteTakingSkill (and so a Memory) at import
+time, so the model was loaded at least twice before the server bound. Memory
+now gets both from here. The model loads on the first embedding, or earlier
+in a background thread via warm_up(); load time and process RSS before and
+after are recorded. Texts already in the EmbeddingCache are never sent to the
+model, so repeated queries don't need it loaded at all.
+"""
+
+import resource
+import sys
+import threading
+import time
+from typing import Dict, Any, Optional
+import chromadb
+from chromadb import EmbeddingFunction, Documents, Embeddings
+from chromadb.utils import embedding_functions
+from embedding_cache import EmbeddingCache
+from config import MEMORY_PATH, EMBEDDING_MODEL
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MB."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+class EmbeddingService(EmbeddingFunction[Documents]):
+    """A Chroma embedding function that loads its model on first use."""
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        self.model_name = model_name
+        self.cache = EmbeddingCache(model_name)
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._warm_thread: Optional[threading.Thread] = None
+        self.stats: Dict[str, Any] = {"model": model_name, "loaded": False, "load_s": 0.0, "rss_before_mb": 0.0,
+                                      "rss_after_mb": 0.0, "calls": 0, "texts": 0, "embed_s": 0.0}
+
+    def _load(self):
+        with self._load_lock:
+            if self._model is not None:
+                return self._model
+            rss_before = peak_rss_mb()
+            started = time.time()
+            self._model = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=self.model_name)
+            self.stats.update(loaded=True, load_s=time.time() - started, rss_before_mb=rss_before,
+                              rss_after_mb=peak_rss_mb())
+            print(f"Embedding model {self.model_name} loaded in {self.stats['load_s']:.2f}s "
+                  f"(peak RSS {rss_before:.0f}MB -> {self.stats['rss_after_mb']:.0f}MB)")
+            return self._model
+
+    def warm_up(self):
+        """Load the model in a background thread so the first query doesn't wait for it."""
+        if self._model is None and self._warm_thread is None:
+            self._warm_thread = threading.Thread(target=self._load, daemon=True)
+            self._warm_thread.start()
+
+    def __call__(self, input: Documents) -> Embeddings:
+        embeddings = self.cache.get_many(input)
+        missing = [i for i, vector in enumerate(embeddings) if vector is None]
+        if missing:
+            model = self._model or self._load()
+            started = time.time()
+            computed = model([input[i] for i in missing])
+            self.stats["calls"] += 1
+            self.stats["texts"] += len(missing)
+            self.stats["embed_s"] += time.time() - started
+            self.cache.put_many([input[i] for i in missing], computed)
+            for i, vector in zip(missing, computed):
+                embeddings[i] = [float(x) for x in vector] # Same shape as cache hits
+        return embeddings
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "cache": self.cache.get_stats()}
+
+
+_embedding_service: Optional[EmbeddingService] = None
+_chroma_client = None
+_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    """The process-wide embedding function, shared by every Memory."""
+    global _embedding_service
+    with _lock:
+        if _embedding_service is None:
+            _embedding_service = EmbeddingService()
+        return _embedding_service
+
+
+def get_chroma_client():
+    """The process-wide Chroma client for MEMORY_PATH."""
+    global _chroma_client
+    with _lock:
+        if _chroma_client is None:
+            _chroma_client = chromadb.PersistentClient(path=MEMORY_PATH)
+        return _chroma_client
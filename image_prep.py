@@ -0,0 +1,79 @@
+"""
+image_prep.py
+
+Preprocessing for vision calls.
+Screenshots from a Retina display are far larger than the visual model can
+use, and every extra pixel is paid for in prefill. prepare_image() hashes the
+original bytes (the cache key for the analysis) and downsamples the image so
+its longest side fits VISION_MAX_IMAGE_SIDE. Downsampled copies are kept
+under data/vision/ by hash, so the same image is only resized once; the
+least recently used are deleted once they pass VISION_RESIZED_MAX_BYTES.
+"""
+
+import hashlib
+import io
+import os
+from typing import Tuple
+from PIL import Image
+from config import VISION_PATH, VISION_MAX_IMAGE_SIDE, VISION_JPEG_QUALITY, VISION_RESIZED_MAX_BYTES
+
+
+def image_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def prepare_image(image_path: str, max_side: int = VISION_MAX_IMAGE_SIDE) -> Tuple[str, bytes]:
+    """Return (sha256 of the original file, image bytes to send to the model)."""
+    with open(image_path, "rb") as f:
+        data = f.read()
+    digest = image_digest(data)
+    cached = os.path.join(VISION_PATH, f"{digest}_{max_side}.jpg")
+    try:
+        with open(cached, "rb") as f:
+            resized = f.read()
+        os.utime(cached) # Refresh for eviction
+        return digest, resized
+    except OSError:
+        pass # Not resized yet, or just evicted
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if max(image.size) <= max_side:
+                return digest, data
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+            out = io.BytesIO()
+            image.convert("RGB").save(out, format="JPEG", quality=VISION_JPEG_QUALITY)
+    except Exception as e:
+        print(f"Could not downsample {image_path}: {e}")
+        return digest, data
+
+    resized = out.getvalue()
+    os.makedirs(VISION_PATH, exist_ok=True)
+    with open(cached, "wb") as f:
+        f.write(resized)
+    _evict_resized()
+    print(f"Downsampled {os.path.basename(image_path)}: {len(data) // 1024}KB -> {len(resized) // 1024}KB")
+    return digest, resized
+
+
+def _evict_resized(max_bytes: int = VISION_RESIZED_MAX_BYTES):
+    """Delete the least recently used downsampled copies until they fit in max_bytes."""
+    entries = []
+    for name in os.listdir(VISION_PATH):
+        if not name.endswith(".jpg"):
+            continue
+        path = os.path.join(VISION_PATH, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
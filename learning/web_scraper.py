@@ -50,9 +50,10 @@ class WebScraper:
                 return {"status": "error", "message": f"No readable text content found on {url}"}
 
             metadata = {"source": "webpage", "url": url, "title": soup.title.string if soup.title else "No Title"}
-            self.memory.add_to_memory("semantic_knowledge", text_content, metadata=metadata)
+            stats = self.memory.add_many("semantic_knowledge", [text_content], [metadata])
 
-            return {"status": "success", "url": url, "message": "Web page content extracted and stored in memory."}
+            return {"status": "success", "url": url, "passages": stats["passages"],
+                    "message": f"Web page content extracted and stored in memory as {stats['passages']} passages."}
         except requests.exceptions.RequestException as e:
             return {"status": "error", "message": f"Failed to fetch web page: {e}"}
         except Exception as e:
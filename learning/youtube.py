@@ -31,9 +31,10 @@ class YouTubeLearner:
             full_transcript = " ".join([entry["text"] for entry in transcript_list])
 
             metadata = {"source": "youtube", "url": video_url, "video_id": video_id}
-            self.memory.add_to_memory("semantic_knowledge", full_transcript, metadata=metadata)
+            stats = self.memory.add_many("semantic_knowledge", [full_transcript], [metadata])
 
-            return {"status": "success", "url": video_url, "message": "Transcript extracted and stored in memory."}
+            return {"status": "success", "url": video_url, "passages": stats["passages"],
+                    "message": f"Transcript extracted and stored in memory as {stats['passages']} passages."}
         except NoTranscriptFound:
             return {"status": "error", "message": f"No transcript found for video: {video_url}"}
         except Exception as e:
@@ -0,0 +1,212 @@
+"""
+llm_scheduler.py
+
+Priority scheduling for every generation Brain sends to Ollama.
+Jobs come in three classes: interactive (the user is waiting), council and
+background (Subconscious, WorldObserver, SynapseEngine dreams). Each model
+has a concurrency limit; when a slot frees up it goes to the most urgent
+waiting job. Interactive work defers queued background jobs and preempts
+running ones, so the user never waits behind a daydream. Within a class,
+calls on a model that is already loaded go ahead of ones that would force a
+load, so work that shares a model is batched instead of thrashing memory.
+Async callers (the server's event loop) queue in the same lines through
+async_slot(), which awaits a wake-up instead of blocking a thread.
+"""
+
+import asyncio
+import itertools
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Any, List, Optional, Tuple
+from cancellation import CancelToken, is_cancelled
+from config import LLM_MODEL_CONCURRENCY, LLM_DEFAULT_CONCURRENCY, LLM_PREEMPT_BACKGROUND, LLM_AFFINITY_MAX_DEFER_S
+
+PRIORITIES = {"interactive": 0, "council": 1, "background": 2}
+
+
+class Preempted(Exception):
+    """A background job was cancelled to make room for interactive work."""
+
+
+class _Job:
+    def __init__(self, model: str, priority: str, seq: int):
+        self.model = model
+        self.priority = priority
+        self.rank = PRIORITIES[priority]
+        self.seq = seq
+        self.token = CancelToken()
+        self.enqueued = time.time()
+
+
+class LLMScheduler:
+    def __init__(self, limits: Dict[str, int] = LLM_MODEL_CONCURRENCY, default_limit: int = LLM_DEFAULT_CONCURRENCY,
+                 preempt_background: bool = LLM_PREEMPT_BACKGROUND, residency=None):
+        self.limits = limits
+        self.residency = residency # Optional ResidencyManager for model affinity
+        self.default_limit = default_limit
+        self.preempt_background = preempt_background
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting: List[_Job] = []
+        self._running: List[_Job] = []
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+        self.stats: Dict[str, Dict[str, Any]] = {
+            cls: {"submitted": 0, "started": 0, "completed": 0, "preempted": 0, "wait_s_total": 0.0, "max_wait_s": 0.0}
+            for cls in PRIORITIES
+        }
+
+    @contextmanager
+    def slot(self, model: str, priority: str = "interactive", cancel: Optional[CancelToken] = None):
+        """
+        Hold one generation slot on model for the duration of the block.
+        Yields the job's CancelToken; a background job must stop when it is
+        cancelled (check it between chunks and raise Preempted).
+        """
+        job = self._acquire(model, priority if priority in PRIORITIES else "interactive", cancel)
+        try:
+            yield job.token
+        finally:
+            self._release(job)
+
+    @asynccontextmanager
+    async def async_slot(self, model: str, priority: str = "interactive", cancel: Optional[CancelToken] = None):
+        """slot() for coroutines: waits in the same queue without holding a thread."""
+        job = await self._acquire_async(model, priority if priority in PRIORITIES else "interactive", cancel)
+        try:
+            yield job.token
+        finally:
+            self._release(job)
+
+    def _limit(self, model: str) -> int:
+        return self.limits.get(model, self.default_limit)
+
+    def _interactive_pending(self) -> bool:
+        return any(j.rank == 0 for j in self._waiting + self._running)
+
+    def _has_free_slot(self, model: str) -> bool:
+        return sum(1 for j in self._running if j.model == model) < self._limit(model)
+
+    def _should_batch_behind(self, job: _Job) -> bool:
+        """True while an equally urgent job on an already-loaded model could run instead of loading this one."""
+        if not self.residency or self.residency.is_resident(job.model):
+            return False
+        if time.time() - job.enqueued >= LLM_AFFINITY_MAX_DEFER_S:
+            return False
+        return any(j.rank <= job.rank and j.model != job.model and self.residency.is_resident(j.model)
+                   and self._has_free_slot(j.model) for j in self._waiting)
+
+    def _can_start(self, job: _Job) -> bool:
+        if not self._has_free_slot(job.model):
+            return False
+        if self._should_batch_behind(job):
+            return False
+        if job.priority == "background" and self.preempt_background and self._interactive_pending():
+            return False
+        # Slots go to the most urgent job first, FIFO within a class
+        return not any(j.model == job.model and (j.rank, j.seq) < (job.rank, job.seq) for j in self._waiting)
+
+    def _enqueue(self, model: str, priority: str) -> _Job:
+        """Queue a job; called with _cond held."""
+        job = _Job(model, priority, next(self._seq))
+        self._waiting.append(job)
+        self.stats[priority]["submitted"] += 1
+        if priority == "interactive" and self.preempt_background:
+            for running in self._running:
+                if running.priority == "background" and not running.token.cancelled:
+                    print(f"Scheduler: preempting background job on {running.model}")
+                    running.token.cancel()
+        return job
+
+    def _try_start(self, job: _Job, cancel: Optional[CancelToken]) -> bool:
+        """Move a queued job to running if it may start now; called with _cond held."""
+        if is_cancelled(cancel) or job.token.cancelled:
+            self._waiting.remove(job)
+            self._notify_all()
+            raise Preempted(f"{job.priority} job for {job.model} cancelled while queued")
+        if not self._can_start(job):
+            return False
+        self._waiting.remove(job)
+        self._running.append(job)
+        waited = time.time() - job.enqueued
+        stats = self.stats[job.priority]
+        stats["started"] += 1
+        stats["wait_s_total"] += waited
+        stats["max_wait_s"] = max(stats["max_wait_s"], waited)
+        if waited > 1.0:
+            print(f"Scheduler: {job.priority} job for {job.model} waited {waited:.1f}s")
+        return True
+
+    def _acquire(self, model: str, priority: str, cancel: Optional[CancelToken]) -> _Job:
+        with self._cond:
+            job = self._enqueue(model, priority)
+            while not self._try_start(job, cancel):
+                # Timed wait so a cancelled caller doesn't sit in the queue until the next release
+                self._cond.wait(timeout=0.5)
+            return job
+
+    async def _acquire_async(self, model: str, priority: str, cancel: Optional[CancelToken]) -> _Job:
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            job = self._enqueue(model, priority)
+            self._async_waiters.append(waiter)
+        try:
+            while True:
+                with self._cond:
+                    if self._try_start(job, cancel):
+                        return job
+                    waiter[1].clear()
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            with self._cond:
+                if job in self._waiting:
+                    self._waiting.remove(job)
+                    self._notify_all()
+            raise
+        finally:
+            with self._cond:
+                self._async_waiters.remove(waiter)
+
+    def _notify_all(self):
+        """Wake every waiter, threads and coroutines alike; called with _cond held."""
+        self._cond.notify_all()
+        for loop, event in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass # That event loop is closed
+
+    def _release(self, job: _Job):
+        with self._cond:
+            self._running.remove(job)
+            key = "preempted" if job.token.cancelled else "completed"
+            self.stats[job.priority][key] += 1
+            self._notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            classes = {}
+            for cls, stats in self.stats.items():
+                classes[cls] = {
+                    **stats,
+                    "queued": sum(1 for j in self._waiting if j.priority == cls),
+                    "running": sum(1 for j in self._running if j.priority == cls),
+                    "avg_wait_s": stats["wait_s_total"] / stats["started"] if stats["started"] else 0.0,
+                }
+            return {"classes": classes, "models": sorted({j.model for j in self._running})}
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(residency=None) -> LLMScheduler:
+    """The process-wide scheduler, shared by every Brain."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(residency=residency)
+        return _scheduler
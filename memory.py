@@ -6,10 +6,54 @@ It handles short-term (conversation history), long-term (task summaries, learned
 and episodic memory (past sessions), as well as semantic memory from learned content.
 """
 
-import chromadb
-from chromadb.utils import embedding_functions
-from typing import List, Dict, Any, Optional
-from config import MEMORY_PATH
+import hashlib
+import time
+import uuid
+from typing import List, Dict, Any, Optional, Tuple
+from embedding_service import get_embedding_service, get_chroma_client
+from memory_index import RecencyIndex
+from config import (MEMORY_PATH, MEMORY_CHUNK_CHARS, MEMORY_CHUNK_OVERLAP, MEMORY_EMBED_BATCH_SIZE,
+                    MEMORY_DEDUP_SIMILARITY, MEMORY_DEDUP_COLLECTIONS)
+
+
+def content_id(collection_name: str, document: str) -> str:
+    """Deterministic ID from the document's text, ignoring whitespace differences."""
+    normalized = " ".join(document.split())
+    return f"{collection_name}_{hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:24]}"
+
+
+def entry_id(collection_name: str, document: str) -> str:
+    """Content ID in the knowledge collections; a unique one elsewhere, since repeated turns are separate entries."""
+    if collection_name in MEMORY_DEDUP_COLLECTIONS:
+        return content_id(collection_name, document)
+    return f"{collection_name}_{uuid.uuid4().hex}"
+
+
+def chunk_text(text: str, size: int = MEMORY_CHUNK_CHARS, overlap: int = MEMORY_CHUNK_OVERLAP) -> List[Tuple[int, int, str]]:
+    """
+    Split text into overlapping passages of about `size` characters, breaking
+    on whitespace where possible. Returns (start, end, passage) with offsets
+    into the original text.
+    """
+    passages = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + size)
+        if end < len(text):
+            # Back up to the last space so words aren't cut in half
+            space = text.rfind(" ", start + size // 2, end)
+            if space != -1:
+                end = space
+        passage = text[start:end].strip()
+        if passage:
+            passages.append((start, end, passage))
+        if end >= len(text):
+            break
+        next_start = max(start + 1, end - overlap)
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return passages
+
 
 class Memory:
     """
@@ -17,8 +61,9 @@ class Memory:
     """
 
     def __init__(self):
-        self.client = chromadb.PersistentClient(path=MEMORY_PATH)
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
+        # Shared across every Memory; the model itself loads on first embedding
+        self.client = get_chroma_client()
+        self.embedding_function = get_embedding_service()
 
         self.collections = {
             "conversation_history": self.client.get_or_create_collection(
@@ -38,27 +83,131 @@ class Memory:
                 embedding_function=self.embedding_function
             ),
         }
+        self.recency = RecencyIndex()
+        self._backfill_recency("conversation_history")
         print(f"Memory initialized. ChromaDB path: {MEMORY_PATH}")
 
-    def add_to_memory(self, collection_name: str, document: str, metadata: Optional[Dict[str, Any]] = None, id: Optional[str] = None):
+    def _backfill_recency(self, collection_name: str):
+        """One-time scan to index entries written before the recency index existed."""
+        collection = self.collections[collection_name]
+        if self.recency.count(collection_name) or not collection.count():
+            return
+        existing = collection.get(include=["metadatas"])
+        self.recency.record(collection_name, existing["ids"], existing["metadatas"])
+        print(f"Indexed {len(existing['ids'])} existing {collection_name} entries by time")
+
+    def add_to_memory(self, collection_name: str, document: str, metadata: Optional[Dict[str, Any]] = None, id: Optional[str] = None) -> str:
         """
-        Adds a document to a specified memory collection.
+        Adds a document to a specified memory collection and returns its ID.
+        Without an explicit id, knowledge collections derive the ID from the
+        content, so storing the same text again updates the existing entry
+        instead of adding a copy, and a near-duplicate of an existing entry is
+        not stored at all. Conversation turns always get a new ID.
         """
         if collection_name not in self.collections:
             raise ValueError(f"Collection '{collection_name}' does not exist.")
-        
-        # Generate a simple ID if not provided
+
+        embedding = self.embedding_function([document])[0]
         if not id:
-            id = f"{collection_name}_{self.collections[collection_name].count() + 1}"
+            id = entry_id(collection_name, document)
+            duplicate = self._near_duplicates(collection_name, [id], [embedding])[0]
+            if duplicate:
+                print(f"Skipped near-duplicate in {collection_name} (matches {duplicate}): {document[:50]}...")
+                return duplicate
 
-        add_kwargs = {
+        upsert_kwargs = {
             "documents": [document],
+            "embeddings": [embedding],
             "ids": [id]
         }
         if metadata:
-            add_kwargs["metadatas"] = [metadata]
-        self.collections[collection_name].add(**add_kwargs)
+            upsert_kwargs["metadatas"] = [metadata]
+        self.collections[collection_name].upsert(**upsert_kwargs)
+        self.recency.record(collection_name, [id], [metadata])
         print(f"Added to {collection_name}: {document[:50]}...")
+        return id
+
+    def _near_duplicates(self, collection_name: str, ids: List[str], embeddings: List[List[float]]) -> List[Optional[str]]:
+        """For each embedding, the ID of an existing entry (other than its own) that is nearly identical, or None."""
+        if collection_name not in MEMORY_DEDUP_COLLECTIONS or not embeddings:
+            return [None] * len(ids)
+        collection = self.collections[collection_name]
+        if collection.count() == 0:
+            return [None] * len(ids)
+        results = collection.query(query_embeddings=embeddings, n_results=2, include=["distances"])
+        # Collections use Chroma's default squared-L2 space; for the normalized
+        # MiniLM embeddings that is 2 - 2 * cosine similarity
+        max_distance = 2 * (1 - MEMORY_DEDUP_SIMILARITY)
+        duplicates = []
+        for own_id, match_ids, distances in zip(ids, results["ids"], results["distances"]):
+            duplicates.append(next((match for match, distance in zip(match_ids, distances)
+                                    if match != own_id and distance <= max_distance), None))
+        return duplicates
+
+    def add_many(self, collection_name: str, documents: List[str], metadatas: Optional[List[Dict[str, Any]]] = None,
+                 chunk_size: int = MEMORY_CHUNK_CHARS, overlap: int = MEMORY_CHUNK_OVERLAP,
+                 batch_size: int = MEMORY_EMBED_BATCH_SIZE) -> Dict[str, Any]:
+        """
+        Adds many documents at once. Long documents are split into overlapping
+        passages; each passage's metadata carries its source document's
+        metadata plus chunk index and character offsets. Passages get IDs like
+        add_to_memory, are embedded in batches, and everything that
+        isn't a (near-)duplicate is upserted in a single call. Returns
+        throughput stats.
+        """
+        if collection_name not in self.collections:
+            raise ValueError(f"Collection '{collection_name}' does not exist.")
+        metadatas = metadatas or [{} for _ in documents]
+        started = time.time()
+
+        passages, passage_metadatas, ids, seen = [], [], [], set()
+        for document, metadata in zip(documents, metadatas):
+            chunks = chunk_text(document, chunk_size, overlap)
+            for index, (char_start, char_end, passage) in enumerate(chunks):
+                passage_id = entry_id(collection_name, passage)
+                if passage_id in seen:
+                    continue # Repeated passage within this batch
+                seen.add(passage_id)
+                ids.append(passage_id)
+                passages.append(passage)
+                passage_metadatas.append({**(metadata or {}), "chunk": index, "chunks": len(chunks),
+                                          "char_start": char_start, "char_end": char_end})
+        if not passages:
+            return {"documents": len(documents), "passages": 0, "near_duplicates": 0, "embed_s": 0.0, "batch_s": [],
+                    "docs_per_s": 0.0}
+
+        embeddings, batch_times = [], []
+        for i in range(0, len(passages), batch_size):
+            batch_started = time.time()
+            embeddings.extend(self.embedding_function(passages[i:i + batch_size]))
+            batch_times.append(time.time() - batch_started)
+
+        duplicates = self._near_duplicates(collection_name, ids, embeddings)
+        keep = [i for i, duplicate in enumerate(duplicates) if not duplicate]
+        if keep:
+            self.collections[collection_name].upsert(
+                documents=[passages[i] for i in keep],
+                embeddings=[embeddings[i] for i in keep],
+                metadatas=[passage_metadatas[i] for i in keep],
+                ids=[ids[i] for i in keep],
+            )
+            self.recency.record(collection_name, [ids[i] for i in keep], [passage_metadatas[i] for i in keep])
+        elapsed = time.time() - started
+        embed_s = sum(batch_times)
+        stats = {
+            "documents": len(documents),
+            "passages": len(passages),
+            "near_duplicates": len(passages) - len(keep),
+            "embed_s": embed_s,
+            "batch_s": batch_times,
+            "docs_per_s": len(documents) / elapsed if elapsed else 0.0,
+            "passages_per_s": len(passages) / elapsed if elapsed else 0.0,
+        }
+        print(f"Added to {collection_name}: {len(documents)} documents as {len(keep)} passages "
+              f"({stats['near_duplicates']} near-duplicates skipped) in {elapsed:.2f}s "
+              f"({stats['docs_per_s']:.1f} docs/s, embedding {embed_s:.2f}s over {len(batch_times)} batches, "
+              f"{embed_s / len(batch_times):.2f}s/batch)")
+        return stats
 
     def retrieve_from_memory(self, collection_name: str, query_text: str, n_results: int = 5) -> List[Dict[str, Any]]:
         """
@@ -81,21 +230,26 @@ class Memory:
 
     def get_conversation_history(self, n_messages: int = 10) -> List[str]:
         """
-        Retrieves the most recent conversation history.
+        Retrieves the most recent conversation history, newest first.
         """
-        # ChromaDB doesn't inherently order by insertion, so we'll retrieve all and sort if metadata allows
-        # For simplicity, let's assume we store a timestamp in metadata for ordering
-        all_messages = self.collections["conversation_history"].get(include=["documents", "metadatas"])
-        
-        # If timestamps are available, sort by them. Otherwise, return in arbitrary order.
-        if all_messages and "metadatas" in all_messages and all_messages["metadatas"] and "timestamp" in all_messages["metadatas"][0]:
-            sorted_messages = sorted(
-                zip(all_messages["documents"], all_messages["metadatas"]),
-                key=lambda x: x[1].get("timestamp", 0), reverse=True
-            )
-            return [doc for doc, meta in sorted_messages[:n_messages]]
-        else:
-            return all_messages["documents"][-n_messages:] if all_messages and "documents" in all_messages else []
+        return [entry["document"] for entry in self.get_conversation_page(n_messages)["messages"]]
+
+    def get_conversation_page(self, limit: int = 10, cursor: Optional[str] = None, since: Optional[float] = None,
+                              until: Optional[float] = None) -> Dict[str, Any]:
+        """
+        One page of conversation history, newest first, optionally limited to
+        [since, until] (epoch seconds). Pass the returned next_cursor to get
+        the page after it. Only this page's documents are read from Chroma.
+        """
+        page, next_cursor = self.recency.newest("conversation_history", limit, cursor, since, until)
+        if not page:
+            return {"messages": [], "next_cursor": None}
+        ids = [id for id, _ in page]
+        found = self.collections["conversation_history"].get(ids=ids, include=["documents", "metadatas"])
+        by_id = {id: (doc, meta) for id, doc, meta in zip(found["ids"], found["documents"], found["metadatas"])}
+        messages = [{"id": id, "document": by_id[id][0], "metadata": by_id[id][1], "timestamp": timestamp}
+                    for id, timestamp in page if id in by_id]
+        return {"messages": messages, "next_cursor": next_cursor}
 
     def clear_memory(self, collection_name: str):
         """
@@ -109,5 +263,6 @@ class Memory:
             name=collection_name,
             embedding_function=self.embedding_function
         )
+        self.recency.clear(collection_name)
         print(f"Collection '{collection_name}' cleared.")
 
@@ -0,0 +1,97 @@
+"""
+memory_index.py
+
+Ordered side index for Memory's Chroma collections.
+Chroma can't sort or page by time, so "the newest N conversation turns"
+used to mean fetching the whole collection and sorting it in Python. Every
+write through Memory also records (collection, id, timestamp) here, in a
+SQLite table indexed by time; recency and time-range queries read N ids from
+it with LIMIT and fetch only those documents from Chroma. Pages continue from
+an opaque "timestamp|id" cursor.
+"""
+
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from config import DATA_PATH
+
+MEMORY_INDEX_DB = os.path.join(DATA_PATH, "memory_index.db")
+
+
+def entry_timestamp(metadata: Optional[Dict[str, Any]], default: float) -> float:
+    """Epoch seconds from metadata["timestamp"] (a number or ISO string), else default."""
+    value = (metadata or {}).get("timestamp")
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            pass
+    return default
+
+
+class RecencyIndex:
+    def __init__(self, db_file: str = MEMORY_INDEX_DB):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+                collection TEXT NOT NULL,
+                id TEXT NOT NULL,
+                timestamp REAL NOT NULL,
+                PRIMARY KEY (collection, id)
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_time ON entries (collection, timestamp, id)')
+        self._conn.commit()
+
+    def record(self, collection: str, ids: Sequence[str], metadatas: Optional[Sequence[Optional[Dict[str, Any]]]] = None):
+        """Index ids written to collection, timed by their metadata timestamp or now."""
+        now = time.time()
+        metadatas = metadatas or [None] * len(ids)
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO entries (collection, id, timestamp) VALUES (?, ?, ?)',
+                [(collection, id, entry_timestamp(metadata, now)) for id, metadata in zip(ids, metadatas)])
+            self._conn.commit()
+
+    def count(self, collection: str) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM entries WHERE collection = ?', (collection,)).fetchone()[0]
+
+    def clear(self, collection: str):
+        with self._lock:
+            self._conn.execute('DELETE FROM entries WHERE collection = ?', (collection,))
+            self._conn.commit()
+
+    def newest(self, collection: str, limit: int, cursor: Optional[str] = None, since: Optional[float] = None,
+               until: Optional[float] = None) -> Tuple[List[Tuple[str, float]], Optional[str]]:
+        """
+        Up to limit (id, timestamp) pairs, newest first, optionally within
+        [since, until] and after a cursor from a previous page. Returns the
+        page and the cursor for the next one (None when there is no more).
+        """
+        where, params = ['collection = ?'], [collection]
+        if since is not None:
+            where.append('timestamp >= ?')
+            params.append(since)
+        if until is not None:
+            where.append('timestamp <= ?')
+            params.append(until)
+        if cursor:
+            cursor_ts, cursor_id = cursor.split("|", 1)
+            where.append('(timestamp < ? OR (timestamp = ? AND id < ?))')
+            params.extend([float(cursor_ts), float(cursor_ts), cursor_id])
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT id, timestamp FROM entries WHERE {" AND ".join(where)} '
+                'ORDER BY timestamp DESC, id DESC LIMIT ?', params + [limit + 1]).fetchall()
+        page = rows[:limit]
+        next_cursor = f"{page[-1][1]!r}|{page[-1][0]}" if len(rows) > limit else None
+        return page, next_cursor
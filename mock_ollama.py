@@ -0,0 +1,367 @@
+"""
+mock_ollama.py
+
+A stand-in for the Ollama server, for benchmarking and regression-testing
+Timmy without a GPU or any 30B models. Implements the part of the API that
+Brain and the Council use: /api/chat (streaming and not, with structured
+`format`), /api/tags, /api/ps and /api/embed.
+
+Replies come from a scripts file (data/mock_ollama_scripts.json by default):
+
+    {
+      "default": "Mock reply.",
+      "scripts": [
+        {"match": "weather", "model": "qwen3:30b",
+         "responses": ["{\"action\": \"search_web\", \"params\": {\"query\": \"weather\"}}", "It's sunny."],
+         "first_token_s": 0.5, "tokens_per_s": 30}
+      ]
+    }
+
+`match` is a regex on the last user message; `responses` are replayed in
+order (the last one repeats), or `tokens` gives an exact recorded token
+list. First-token latency, tokens/s and model load time are configurable
+globally (config.py / flags) and per script. With --record URL the server
+proxies to a real Ollama and appends what it sees to the scripts file.
+
+Run it, then start Timmy against it:
+
+    python mock_ollama.py
+    TIMMY_MOCK_OLLAMA=1 python main.py
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+from config import (AVAILABLE_MODELS, FAST_PATH_MODEL, MOCK_OLLAMA_PORT, MOCK_OLLAMA_SCRIPTS, MOCK_OLLAMA_FIRST_TOKEN_S,
+                    MOCK_OLLAMA_TOKENS_PER_S, MOCK_OLLAMA_LOAD_S)
+
+NS = 1_000_000_000
+EMBED_DIM = 384
+
+
+def _tokenize(text: str) -> List[str]:
+    """Word-sized pieces that join back to exactly `text`."""
+    return re.findall(r"\s*\S+|\s+", text)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _params_b(model: str) -> float:
+    """Parameter count in billions from a tag like qwen3:30b (7 if unknown)."""
+    match = re.search(r"(\d+(?:\.\d+)?)b", model.split(":")[-1])
+    return float(match.group(1)) if match else 7.0
+
+
+def _model_size(model: str) -> int:
+    # ~0.6 bytes per parameter at Q4_K_M
+    return int(_params_b(model) * 1e9 * 0.6)
+
+
+def _keep_alive_s(value: Any) -> float:
+    if value is None:
+        return 300.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r"(-?\d+(?:\.\d+)?)(ms|s|m|h)?", str(value).strip())
+    if not match:
+        return 300.0
+    number, unit = float(match.group(1)), match.group(2) or "s"
+    return number * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+
+
+def _from_schema(schema: Any) -> Any:
+    """Smallest value that satisfies a JSON schema, for `format` requests no script covers."""
+    if not isinstance(schema, dict):
+        return {}
+    if "const" in schema:
+        return schema["const"]
+    if schema.get("enum"):
+        return schema["enum"][0]
+    for key in ("anyOf", "oneOf"):
+        if schema.get(key):
+            return _from_schema(schema[key][0])
+    kind = schema.get("type", "object")
+    if kind == "object":
+        properties = schema.get("properties", {})
+        return {name: _from_schema(properties.get(name, {})) for name in schema.get("required", list(properties))}
+    return {"array": [], "string": "", "number": 0, "integer": 0, "boolean": False}.get(kind, None)
+
+
+def _embedding(text: str) -> List[float]:
+    """Hashed bag-of-words vector: deterministic, and similar texts land close together."""
+    vector = [0.0] * EMBED_DIM
+    for word in re.findall(r"[a-z0-9']+", text.lower()):
+        digest = hashlib.md5(word.encode("utf-8")).digest()
+        vector[int.from_bytes(digest[:4], "little") % EMBED_DIM] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+class MockOllama:
+    def __init__(self, scripts_file: str = MOCK_OLLAMA_SCRIPTS, first_token_s: float = MOCK_OLLAMA_FIRST_TOKEN_S,
+                 tokens_per_s: float = MOCK_OLLAMA_TOKENS_PER_S, load_s: float = MOCK_OLLAMA_LOAD_S,
+                 record_url: Optional[str] = None):
+        self.scripts_file = scripts_file
+        self.first_token_s = first_token_s
+        self.tokens_per_s = tokens_per_s
+        self.load_s = load_s
+        self.record_url = record_url
+        self._lock = threading.Lock()
+        self._loaded: Dict[str, float] = {} # model -> expiry (epoch seconds)
+        self._turns: Dict[int, int] = {}    # script index -> responses replayed
+        self.scripts: Dict[str, Any] = self._load_scripts()
+
+    def _load_scripts(self) -> Dict[str, Any]:
+        if os.path.exists(self.scripts_file):
+            try:
+                with open(self.scripts_file, 'r') as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"Error loading mock scripts: {e}")
+        return {"default": "", "scripts": []}
+
+    def _save_scripts(self):
+        os.makedirs(os.path.dirname(self.scripts_file), exist_ok=True)
+        with open(self.scripts_file, 'w') as f:
+            json.dump(self.scripts, f, indent=2)
+
+    def _last_user(self, messages: List[Dict[str, Any]]) -> str:
+        for message in reversed(messages):
+            if message.get("role") == "user":
+                return message.get("content", "")
+        return ""
+
+    def _script_for(self, model: str, prompt: str) -> Optional[Dict[str, Any]]:
+        for index, script in enumerate(self.scripts.get("scripts", [])):
+            if script.get("model") and script["model"] != model:
+                continue
+            if re.search(script.get("match", ""), prompt, re.IGNORECASE | re.DOTALL):
+                return {**script, "_index": index}
+        return None
+
+    def _reply_tokens(self, body: Dict[str, Any], script: Optional[Dict[str, Any]]) -> List[str]:
+        if script:
+            if script.get("tokens"):
+                return list(script["tokens"])
+            responses = script.get("responses") or [script.get("response", "")]
+            with self._lock:
+                turn = self._turns.get(script["_index"], 0)
+                self._turns[script["_index"]] = turn + 1
+            return _tokenize(responses[min(turn, len(responses) - 1)])
+        if body.get("format"):
+            schema = body["format"]
+            return _tokenize(json.dumps(_from_schema(schema) if isinstance(schema, dict) else {}))
+        default = self.scripts.get("default") or "Mock reply to: {prompt}"
+        return _tokenize(default.replace("{prompt}", self._last_user(body.get("messages", []))[:80]))
+
+    def _load(self, model: str, keep_alive: Any) -> float:
+        """Simulated load: returns the seconds spent loading (0 when already resident)."""
+        now = time.time()
+        with self._lock:
+            resident = self._loaded.get(model, 0) > now
+            ttl = _keep_alive_s(keep_alive)
+            if ttl <= 0:
+                self._loaded.pop(model, None)
+            else:
+                self._loaded[model] = now + ttl
+        return 0.0 if resident or ttl <= 0 else self.load_s
+
+    def _final(self, model: str, prompt_tokens: int, eval_tokens: int, load_s: float, prefill_s: float,
+               eval_s: float, content: str) -> Dict[str, Any]:
+        return {
+            "model": model, "created_at": _now(),
+            "message": {"role": "assistant", "content": content},
+            "done": True, "done_reason": "stop",
+            "total_duration": int((load_s + prefill_s + eval_s) * NS),
+            "load_duration": int(load_s * NS),
+            "prompt_eval_count": prompt_tokens, "prompt_eval_duration": int(prefill_s * NS),
+            "eval_count": eval_tokens, "eval_duration": int(eval_s * NS),
+        }
+
+    async def chat(self, body: Dict[str, Any]):
+        model = body.get("model", "")
+        messages = body.get("messages") or []
+        load_s = self._load(model, body.get("keep_alive"))
+        if not messages:
+            # Preload / unload request
+            await asyncio.sleep(load_s)
+            return JSONResponse(self._final(model, 0, 0, load_s, 0.0, 0.0, ""))
+        if self.record_url:
+            return await self._record(body)
+
+        prompt = self._last_user(messages)
+        script = self._script_for(model, prompt)
+        tokens = self._reply_tokens(body, script)
+        first_token_s = (script or {}).get("first_token_s", self.first_token_s)
+        tokens_per_s = (script or {}).get("tokens_per_s", self.tokens_per_s) or 1e9
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4 + 1
+
+        if not body.get("stream", True):
+            eval_s = len(tokens) / tokens_per_s
+            await asyncio.sleep(load_s + first_token_s + eval_s)
+            return JSONResponse(self._final(model, prompt_tokens, len(tokens), load_s, first_token_s, eval_s,
+                                            "".join(tokens)))
+
+        async def stream():
+            await asyncio.sleep(load_s + first_token_s)
+            started = time.perf_counter()
+            for token in tokens:
+                yield json.dumps({"model": model, "created_at": _now(),
+                                  "message": {"role": "assistant", "content": token}, "done": False}) + "\n"
+                await asyncio.sleep(1 / tokens_per_s)
+            eval_s = time.perf_counter() - started
+            yield json.dumps(self._final(model, prompt_tokens, len(tokens), load_s, first_token_s, eval_s, "")) + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    async def _record(self, body: Dict[str, Any]):
+        """
+        Proxy to a real Ollama and save the token stream as a replayable script.
+        Upstream is always streamed so the script gets per-token timing; a
+        stream=false caller gets the usual single JSON object back.
+        """
+        if body.get("stream", True):
+            async def stream():
+                relay = self._relay(body)
+                try:
+                    async for line in relay:
+                        yield line + "\n"
+                finally:
+                    # Closed right away on a client hang-up, so the partial script is saved now
+                    await relay.aclose()
+
+            return StreamingResponse(stream(), media_type="application/x-ndjson")
+        content: List[str] = []
+        final: Dict[str, Any] = {}
+        async for line in self._relay(body):
+            chunk = json.loads(line)
+            content.append(chunk.get("message", {}).get("content", ""))
+            if chunk.get("done"):
+                final = chunk
+        message = {**final.get("message", {}), "role": "assistant", "content": "".join(content)}
+        return JSONResponse({**final, "message": message})
+
+    async def _relay(self, body: Dict[str, Any]):
+        """
+        Upstream's streamed reply, line by line. The script is saved when the
+        relay ends, including when the client hangs up early (the agent stops
+        reading at an action's closing brace), with the tokens seen so far.
+        """
+        prompt = self._last_user(body.get("messages") or [])
+        request = {**body, "stream": True}
+        tokens: List[str] = []
+        started = time.perf_counter()
+        first_token_s = None
+        eval_s = None
+        try:
+            async with httpx.AsyncClient(timeout=None) as client:
+                async with client.stream("POST", f"{self.record_url.rstrip('/')}/api/chat", json=request) as upstream:
+                    async for line in upstream.aiter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        content = chunk.get("message", {}).get("content", "")
+                        if content:
+                            first_token_s = first_token_s if first_token_s is not None else time.perf_counter() - started
+                            tokens.append(content)
+                        if chunk.get("done"):
+                            eval_s = (chunk.get("eval_duration") or 0) / NS
+                        yield line
+        finally:
+            if tokens:
+                complete = eval_s is not None
+                if not complete:
+                    # No server timings: decode time is what we measured after the first token
+                    eval_s = time.perf_counter() - started - (first_token_s or 0.0)
+                script = {"model": body.get("model"), "match": "^" + re.escape(prompt) + "$",
+                          "tokens": tokens, "first_token_s": round(first_token_s or 0.0, 3),
+                          "tokens_per_s": round(len(tokens) / eval_s, 1) if eval_s else self.tokens_per_s,
+                          "complete": complete}
+                with self._lock:
+                    self.scripts.setdefault("scripts", []).append(script)
+                    self._save_scripts()
+
+    def tags(self) -> Dict[str, Any]:
+        models = list(dict.fromkeys(AVAILABLE_MODELS + [FAST_PATH_MODEL]))
+        return {"models": [{"name": m, "model": m, "modified_at": _now(), "size": _model_size(m),
+                            "digest": hashlib.sha256(m.encode()).hexdigest(),
+                            "details": {"format": "gguf", "parameter_size": f"{_params_b(m):g}B",
+                                        "quantization_level": "Q4_K_M"}}
+                           for m in models]}
+
+    def ps(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            loaded = {m: expiry for m, expiry in self._loaded.items() if expiry > now}
+            self._loaded = loaded
+        return {"models": [{"name": m, "model": m, "size": _model_size(m), "size_vram": _model_size(m),
+                            "digest": hashlib.sha256(m.encode()).hexdigest(),
+                            "expires_at": datetime.fromtimestamp(expiry, timezone.utc).isoformat()}
+                           for m, expiry in loaded.items()]}
+
+    def embed(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        inputs = body.get("input", "")
+        texts = inputs if isinstance(inputs, list) else [inputs]
+        self._load(body.get("model", ""), body.get("keep_alive"))
+        return {"model": body.get("model"), "embeddings": [_embedding(t) for t in texts]}
+
+
+def create_app(mock: MockOllama) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/")
+    async def root():
+        return PlainTextResponse("Ollama is running")
+
+    @app.get("/api/version")
+    async def version():
+        return {"version": "0.0.0-mock"}
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        return await mock.chat(await request.json())
+
+    @app.get("/api/tags")
+    async def tags():
+        return mock.tags()
+
+    @app.get("/api/ps")
+    async def ps():
+        return mock.ps()
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        return mock.embed(await request.json())
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock Ollama server for Timmy benchmarks and tests")
+    parser.add_argument("--port", type=int, default=MOCK_OLLAMA_PORT)
+    parser.add_argument("--scripts", default=MOCK_OLLAMA_SCRIPTS)
+    parser.add_argument("--first-token", type=float, default=MOCK_OLLAMA_FIRST_TOKEN_S, help="seconds to first token")
+    parser.add_argument("--tokens-per-s", type=float, default=MOCK_OLLAMA_TOKENS_PER_S)
+    parser.add_argument("--load", type=float, default=MOCK_OLLAMA_LOAD_S, help="seconds to 'load' a cold model")
+    parser.add_argument("--record", metavar="URL", help="proxy to a real Ollama and record its streams")
+    args = parser.parse_args()
+
+    mock = MockOllama(args.scripts, args.first_token, args.tokens_per_s, args.load, args.record)
+    print(f"Mock Ollama on http://127.0.0.1:{args.port} ({len(mock.scripts.get('scripts', []))} scripts)")
+    uvicorn.run(create_app(mock), host="127.0.0.1", port=args.port)
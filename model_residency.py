@@ -0,0 +1,175 @@
+"""
+model_residency.py
+
+Keeps track of which models Ollama has in memory.
+Brain moves between the main, coding and visual models, and the Council
+pulls in up to four more 30B-70B models; every switch can push another model
+out and cost a multi-second reload. The ResidencyManager watches `ollama ps`,
+estimates each model's footprint, and uses recent usage to decide which
+models stay hot (a long keep_alive) and which are let go quickly. The
+scheduler asks it which models are loaded so queued calls on a resident model
+go first, and every load is counted per hour.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional
+from config import (MODEL_KEEP_ALIVE, RESIDENCY_MEMORY_BUDGET_GB, RESIDENCY_REFRESH_S, RESIDENCY_USAGE_HALF_LIFE_S,
+                    RESIDENCY_LOAD_THRESHOLD_S, RESIDENCY_HOT_KEEP_ALIVE)
+
+GB = 1024 ** 3
+PINNED_ROLES = ("main", "fast") # Always hot: nearly every message touches them
+
+
+class ResidencyManager:
+    def __init__(self, client, budget_gb: float = RESIDENCY_MEMORY_BUDGET_GB):
+        self.client = client
+        self.budget_gb = budget_gb
+        self._lock = threading.Lock()
+        self._loaded: Dict[str, Dict[str, Any]] = {}
+        self._refreshed = 0.0
+        self._disk_sizes: Dict[str, float] = {} # GB, from the last successful `ollama list`
+        self._disk_listed = 0.0 # When `ollama list` was last tried
+        self._footprints: Dict[str, float] = {} # GB, learned from `ollama ps`
+        self._usage: Dict[str, float] = {}      # Decayed call counts
+        self._usage_at = time.time()
+        self._loads: deque = deque(maxlen=2000) # (timestamp, model, load_s)
+        self._calls: Dict[str, int] = {}
+
+    def refresh(self, force: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Re-read the loaded models from Ollama, at most every RESIDENCY_REFRESH_S."""
+        now = time.time()
+        if not force and now - self._refreshed < RESIDENCY_REFRESH_S:
+            return self._loaded
+        try:
+            response = self.client.ps()
+        except Exception as e:
+            print(f"Residency: could not list loaded models: {e}")
+            return self._loaded
+        loaded = {}
+        for entry in response.get('models') or []:
+            name = entry.get('model') or entry.get('name')
+            size_gb = (entry.get('size') or 0) / GB
+            loaded[name] = {"size_gb": size_gb, "vram_gb": (entry.get('size_vram') or 0) / GB,
+                            "expires_at": str(entry.get('expires_at') or "")}
+        with self._lock:
+            self._loaded = loaded
+            self._refreshed = now
+            for name, info in loaded.items():
+                if info["size_gb"]:
+                    self._footprints[name] = info["size_gb"]
+        return loaded
+
+    def is_resident(self, model: str) -> bool:
+        """From the last snapshot only, so it is cheap enough to call under the scheduler lock."""
+        return model in self._loaded
+
+    def footprint_gb(self, model: str) -> float:
+        """Observed size when the model has been seen loaded, else weights on disk plus ~20% for the KV cache."""
+        if model in self._footprints:
+            return self._footprints[model]
+        if model not in self._disk_sizes:
+            self._list_disk_sizes()
+        return self._disk_sizes.get(model, 0.0) * 1.2
+
+    def _list_disk_sizes(self):
+        """Re-read model sizes on disk, at most every RESIDENCY_REFRESH_S; a failed list is retried later."""
+        now = time.time()
+        with self._lock:
+            if now - self._disk_listed < RESIDENCY_REFRESH_S:
+                return
+            self._disk_listed = now
+        try:
+            entries = self.client.list().get('models') or []
+        except Exception as e:
+            print(f"Residency: could not list local models: {e}")
+            return
+        sizes = {(entry.get('model') or entry.get('name')): (entry.get('size') or 0) / GB for entry in entries}
+        with self._lock:
+            self._disk_sizes = sizes
+
+    def _decay(self, now: float):
+        factor = 0.5 ** ((now - self._usage_at) / RESIDENCY_USAGE_HALF_LIFE_S)
+        for model in self._usage:
+            self._usage[model] *= factor
+        self._usage_at = now
+
+    def note_call(self, model: str, load_s: float):
+        """Record a finished call; a long load_duration means Ollama had to (re)load the model."""
+        now = time.time()
+        with self._lock:
+            self._decay(now)
+            self._usage[model] = self._usage.get(model, 0.0) + 1.0
+            self._calls[model] = self._calls.get(model, 0) + 1
+            if load_s >= RESIDENCY_LOAD_THRESHOLD_S:
+                self._loads.append((now, model, load_s))
+                print(f"Residency: {model} loaded in {load_s:.1f}s")
+            self._loaded.setdefault(model, {"size_gb": self._footprints.get(model, 0.0), "vram_gb": 0.0,
+                                            "expires_at": ""})
+
+    def hot_models(self, pinned: List[str]) -> List[str]:
+        """Pinned models plus the most used others that still fit in the memory budget."""
+        with self._lock:
+            self._decay(time.time())
+            ranked = sorted(self._usage.items(), key=lambda item: item[1], reverse=True)
+        hot = list(dict.fromkeys(pinned))
+        used = sum(self.footprint_gb(m) for m in hot)
+        for model, score in ranked:
+            if model in hot or score < 0.5:
+                continue
+            size = self.footprint_gb(model)
+            if used + size <= self.budget_gb:
+                hot.append(model)
+                used += size
+        return hot
+
+    def keep_alive(self, model: str, role: str, pinned: List[str]) -> str:
+        """keep_alive for the next call: configured for hot models, short for cold ones."""
+        if role in PINNED_ROLES:
+            return MODEL_KEEP_ALIVE[role]
+        if model not in self.hot_models(pinned):
+            return MODEL_KEEP_ALIVE["other"]
+        return MODEL_KEEP_ALIVE[role] if role != "other" else RESIDENCY_HOT_KEEP_ALIVE
+
+    def get_report(self, pinned: List[str], hours: int = 24) -> Dict[str, Any]:
+        loaded = self.refresh()
+        now = time.time()
+        buckets: Dict[str, Dict[str, Any]] = {}
+        by_model: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            loads = list(self._loads)
+            calls = dict(self._calls)
+        for timestamp, model, load_s in loads:
+            if now - timestamp > hours * 3600:
+                continue
+            hour = time.strftime("%Y-%m-%d %H:00", time.localtime(timestamp))
+            bucket = buckets.setdefault(hour, {"hour": hour, "loads": 0, "load_s": 0.0})
+            bucket["loads"] += 1
+            bucket["load_s"] += load_s
+            stats = by_model.setdefault(model, {"loads": 0, "load_s": 0.0})
+            stats["loads"] += 1
+            stats["load_s"] += load_s
+        for model, count in calls.items():
+            by_model.setdefault(model, {"loads": 0, "load_s": 0.0})["calls"] = count
+        return {
+            "loaded": [{"model": name, **info} for name, info in loaded.items()],
+            "loaded_gb": sum(info["size_gb"] for info in loaded.values()),
+            "budget_gb": self.budget_gb,
+            "hot": self.hot_models(pinned),
+            "loads_per_hour": [buckets[h] for h in sorted(buckets)],
+            "by_model": by_model,
+        }
+
+
+_residency: Optional[ResidencyManager] = None
+_residency_lock = threading.Lock()
+
+
+def get_residency(client) -> ResidencyManager:
+    """The process-wide residency manager, shared by every Brain."""
+    global _residency
+    with _residency_lock:
+        if _residency is None:
+            _residency = ResidencyManager(client)
+        return _residency
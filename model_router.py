@@ -0,0 +1,135 @@
+"""
+model_router.py
+
+Latency-aware model routing for Timmy AI.
+Each task type (chat, tool, code, reasoning) has a chain of candidate models
+ordered by quality and a latency SLO per response. The router predicts how
+long each candidate would take from measured telemetry — time-to-first-token,
+tokens/s, and a reload if the model isn't resident — and picks the best model
+predicted to finish within the SLO. A model whose recent routed calls keep
+missing the SLO is skipped even if its prediction looks fine. Every decision
+is logged with its measured outcome, so the predictions improve from real data.
+"""
+
+import threading
+import time
+from typing import Dict, Any, List, Optional
+from config import (DEFAULT_MAIN_MODEL, DEFAULT_CODING_MODEL, CODING_MODEL_FALLBACK, MODEL_ROUTES, MODEL_ROUTE_SLO_S,
+                    MODEL_ROUTE_EXPECTED_TOKENS, MODEL_ROUTE_MIN_SLO_RATE, MODEL_ROUTE_MIN_SAMPLES,
+                    MODEL_ROUTE_DEFAULT_TOKENS_PER_S, MODEL_ROUTE_LOAD_GB_PER_S, MODEL_ROUTE_STATS_TTL_S)
+from query_router import CODE_PATTERNS
+
+REASONING_KEYWORDS = ("prove", "derive", "why", "step by step", "reason", "plan", "math", "calculate", "compare",
+                      "trade-off", "tradeoff")
+CHAT_KEYWORDS = ("write", "explain", "summarize", "describe", "tell me", "draft", "rewrite", "translate")
+
+
+class ModelRouter:
+    def __init__(self, brain):
+        self.brain = brain
+        self._lock = threading.Lock()
+        self._model_stats: Dict[str, Dict[str, float]] = {}
+        self._route_stats: Dict[str, Dict[str, Dict[str, float]]] = {}
+        self._stats_at = 0.0
+        self.recent: List[Dict[str, Any]] = [] # Last decisions, for the stats endpoint
+
+    @staticmethod
+    def classify(task: str) -> str:
+        """Task type for a free-form sub-task description."""
+        lowered = task.lower()
+        if any(pattern.search(lowered) for pattern in CODE_PATTERNS):
+            return "code"
+        if any(k in lowered for k in REASONING_KEYWORDS):
+            return "reasoning"
+        if any(k in lowered for k in CHAT_KEYWORDS):
+            return "chat"
+        return "tool"
+
+    def candidates(self, task: str) -> List[str]:
+        """The task's chain with the brain's current role models substituted, limited to available models."""
+        roles = {DEFAULT_MAIN_MODEL: self.brain.main_model, DEFAULT_CODING_MODEL: self.brain.coding_model,
+                 CODING_MODEL_FALLBACK: self.brain.coding_model_fallback}
+        chain = list(dict.fromkeys(roles.get(m, m) for m in MODEL_ROUTES.get(task, MODEL_ROUTES["tool"])))
+        available = set(self.brain.get_available_models())
+        return [m for m in chain if m in available] or chain
+
+    def _refresh_stats(self):
+        now = time.time()
+        if now - self._stats_at < MODEL_ROUTE_STATS_TTL_S:
+            return
+        try:
+            model_stats = self.brain.telemetry.model_stats()
+            route_stats = self.brain.telemetry.route_stats()
+        except Exception as e:
+            print(f"Model router: could not read telemetry: {e}")
+            model_stats, route_stats = self._model_stats, self._route_stats
+        with self._lock:
+            self._model_stats, self._route_stats = model_stats, route_stats
+            self._stats_at = now
+
+    def predict(self, model: str, task: str) -> float:
+        """Predicted seconds for one response: load if not resident, time to first token, then decoding."""
+        stats = self._model_stats.get(model, {})
+        tokens_per_s = stats.get("tokens_per_s") or MODEL_ROUTE_DEFAULT_TOKENS_PER_S
+        predicted = stats.get("ttft_s", 1.0) + MODEL_ROUTE_EXPECTED_TOKENS.get(task, 300) / tokens_per_s
+        if not self.brain.residency.is_resident(model):
+            predicted += stats.get("load_s") or self.brain.residency.footprint_gb(model) / MODEL_ROUTE_LOAD_GB_PER_S
+        return predicted
+
+    def _slo_rate(self, task: str, model: str) -> Optional[float]:
+        stats = self._route_stats.get(task, {}).get(model)
+        if not stats or stats["calls"] < MODEL_ROUTE_MIN_SAMPLES:
+            return None
+        return stats["slo_met_rate"]
+
+    def route(self, task: str) -> Dict[str, Any]:
+        """Pick a model for task; returns the decision to pass back to record_outcome()."""
+        self._refresh_stats()
+        self.brain.residency.refresh()
+        slo = MODEL_ROUTE_SLO_S.get(task, MODEL_ROUTE_SLO_S["tool"])
+        chain = self.candidates(task)
+        predictions = {m: self.predict(m, task) for m in chain}
+
+        model, reason, skipped = None, "", []
+        for candidate in chain:
+            rate = self._slo_rate(task, candidate)
+            if predictions[candidate] > slo:
+                skipped.append(f"{candidate} predicted {predictions[candidate]:.0f}s > {slo}s")
+            elif rate is not None and rate < MODEL_ROUTE_MIN_SLO_RATE:
+                skipped.append(f"{candidate} met SLO in {rate:.0%} of recent calls")
+            else:
+                model = candidate
+                reason = "primary" if not skipped else "fallback: " + "; ".join(skipped)
+                break
+        if model is None:
+            # Nothing fits: the fastest is the least bad
+            model = min(chain, key=lambda m: predictions[m])
+            reason = "no model within SLO, fastest predicted"
+
+        decision = {"task": task, "model": model, "reason": reason, "predicted_s": round(predictions[model], 2),
+                    "slo_s": slo, "started": time.time()}
+        if model != chain[0]:
+            print(f"Model router: {task} -> {model} ({reason})")
+        with self._lock:
+            self.recent = (self.recent + [{k: v for k, v in decision.items() if k != "started"}])[-50:]
+        return decision
+
+    def record_outcome(self, decision: Dict[str, Any], actual_s: Optional[float] = None, tokens: int = 0):
+        """Log how the routed call actually went; feeds route_stats() for later decisions."""
+        if actual_s is None:
+            actual_s = time.time() - decision["started"]
+        self.brain.telemetry.record_route(
+            task=decision["task"], model=decision["model"], reason=decision["reason"],
+            predicted_s=decision["predicted_s"], slo_s=decision["slo_s"], actual_s=actual_s, tokens=tokens,
+            met_slo=int(actual_s <= decision["slo_s"]))
+
+    def get_stats(self) -> Dict[str, Any]:
+        self._refresh_stats()
+        with self._lock:
+            return {
+                "slo_s": MODEL_ROUTE_SLO_S,
+                "chains": {task: self.candidates(task) for task in MODEL_ROUTES},
+                "models": self._model_stats,
+                "outcomes": self._route_stats,
+                "recent": list(self.recent),
+            }
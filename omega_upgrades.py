@@ -675,7 +675,7 @@ class PersonaLens:
         - avoids (things they don't say)
         - formality_level (1-10)
         """
-        analysis = self.brain.think(prompt)
+        analysis = self.brain.think(prompt, cache="exact")
         try:
             profile_json = json.loads(analysis)
             self._profile = profile_json
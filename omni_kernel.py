@@ -9,27 +9,53 @@ high-speed execution engine. Includes the "Ben-First" loyalty protocol.
 import json
 import time
 import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
-from config import DATA_PATH
+from cancellation import CancelToken, is_cancelled
+from config import DATA_PATH, KERNEL_MAX_PARALLEL_ACTIONS, KERNEL_MAX_BATCH_SIZE
+
+# Actions that can't share a batch: they stream to the UI or need the
+# results of everything before them.
+UNBATCHABLE_ACTIONS = {"batch", "convene_council", "plan"}
+# Read-only actions that are safe to run on pool threads. Everything else
+# (writes, shell, the Playwright browser, whose objects are bound to the
+# thread that created them) runs one at a time on the calling thread.
+PARALLEL_SAFE_ACTIONS = {"read_file", "list_dir", "search_web", "read_blob"}
 
 class OmniKernel:
     def __init__(self, agent):
         self.agent = agent
         self.loyalty_score = 1.0 # Max loyalty to Ben
-        self.execution_history = []
+        self.execution_history = deque(maxlen=200) # Recent actions only, so memory stays flat
+        self.action_count = 0
+        self._count_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=KERNEL_MAX_PARALLEL_ACTIONS, thread_name_prefix="omni-kernel")
 
-    def execute_omni_action(self, action_name: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    def execute_omni_action(self, action_name: str, params: Dict[str, Any], cancel: Optional[CancelToken] = None) -> Dict[str, Any]:
         """Execute any tool or skill through the unified kernel."""
+        if is_cancelled(cancel):
+            return {"status": "cancelled", "message": f"'{action_name}' skipped: the run was cancelled."}
+        if action_name == "batch":
+            return self.execute_batch(params.get("actions", []), cancel=cancel)
+
         start_time = time.time()
         
         # Ben-First Loyalty Check
         if not self._is_ben_optimized(action_name, params):
             params = self._optimize_for_ben(action_name, params)
         
-        # Execute via the agent's tool/skill system
-        result = self.agent._execute_action({"action": action_name, "params": params})
+        if action_name == "read_blob":
+            # Paging through out-of-band tool output is handled by the kernel itself
+            result = self._read_blob(params)
+        else:
+            # Execute via the agent's tool/skill system
+            result = self.agent._execute_action({"action": action_name, "params": params})
         
         execution_time = time.time() - start_time
+        with self._count_lock:
+            self.action_count += 1
         self.execution_history.append({
             "action": action_name,
             "params": params,
@@ -39,6 +65,68 @@ class OmniKernel:
         
         return result
 
+    def execute_batch(self, actions: List[Dict[str, Any]], cancel: Optional[CancelToken] = None) -> Dict[str, Any]:
+        """
+        Run a batch in its declared order. Each run of consecutive read-only
+        actions goes to the kernel's thread pool at once; any other action
+        waits for the reads before it and runs alone on this thread, so a read
+        after a write sees the write. Results come back in the same order the
+        actions were given, so the model sees a deterministic TOOL_RESULT
+        regardless of finish order.
+        """
+        if not isinstance(actions, list) or not actions:
+            return {"status": "error", "message": "batch needs a non-empty 'actions' list."}
+        if len(actions) > KERNEL_MAX_BATCH_SIZE:
+            return {"status": "error", "message": f"batch is limited to {KERNEL_MAX_BATCH_SIZE} actions."}
+
+        names = [item.get("action", "") if isinstance(item, dict) else "" for item in actions]
+        outcomes: List[Any] = [None] * len(actions)
+        reads: Dict[int, Any] = {} # Index -> future for the current run of reads
+
+        def finish_reads():
+            for index, future in reads.items():
+                outcomes[index] = future.result()
+            reads.clear()
+
+        for i, (name, item) in enumerate(zip(names, actions)):
+            if not name or name in UNBATCHABLE_ACTIONS:
+                outcomes[i] = {"status": "error", "message": f"Action '{name}' can't run inside a batch."}
+            elif name in PARALLEL_SAFE_ACTIONS:
+                reads[i] = self._pool.submit(self._run_batched, name, item.get("params", {}), cancel)
+            else:
+                finish_reads()
+                outcomes[i] = self._run_batched(name, item.get("params", {}), cancel)
+        finish_reads()
+        results = [{"action": name, "result": result} for name, result in zip(names, outcomes)]
+
+        succeeded = sum(1 for r in results if r["result"].get("status") == "success")
+        if succeeded == len(results):
+            status = "success"
+        elif succeeded:
+            status = "partial"
+        else:
+            status = "error"
+        return {"status": status, "results": results}
+
+    def _run_batched(self, action_name: str, params: Dict[str, Any], cancel: Optional[CancelToken]) -> Dict[str, Any]:
+        try:
+            # Actions still queued when the run is cancelled return without running
+            return self.execute_omni_action(action_name, params, cancel=cancel)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    def _read_blob(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return self.agent.blob_store.read(
+                params.get("handle", ""),
+                start_line=params.get("start_line"),
+                end_line=params.get("end_line"),
+                offset=params.get("offset"),
+                length=params.get("length"),
+            )
+        except (TypeError, ValueError) as e:
+            return {"status": "error", "message": f"Bad read_blob params: {e}"}
+
     def _is_ben_optimized(self, action_name: str, params: Dict[str, Any]) -> bool:
         """Check if the action is already optimized for Ben's M4 Max and goals."""
         # Placeholder for complex loyalty/optimization logic
@@ -54,4 +142,4 @@ class OmniKernel:
 
     def get_kernel_status(self) -> str:
         """Get a summary of the kernel's performance and loyalty."""
-        return f"Omni-Kernel: Active | Loyalty: {self.loyalty_score*100}% | Actions: {len(self.execution_history)}"
+        return f"Omni-Kernel: Active | Loyalty: {self.loyalty_score*100}% | Actions: {self.action_count}"
@@ -0,0 +1,111 @@
+"""
+prompt_builder.py
+
+Cached, sectioned system prompt assembly for Timmy AI.
+Each section is rendered once and reused until its owning store reports a
+new version or its TTL runs out. Slow sections (osascript, disk scans) are
+refreshed concurrently under a deadline; if one misses it, the last good
+value is used and the refresh keeps going in the background. Sections are
+always joined in registration order, so the static prefix stays
+byte-identical from call to call.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+
+class PromptSection:
+    def __init__(self, name: str, render: Callable[[], str], ttl: Optional[float] = None,
+                 version: Optional[Callable[[], Any]] = None, slow: bool = False):
+        self.name = name
+        self.render = render
+        self.ttl = ttl
+        self.version = version
+        self.slow = slow
+
+
+class PromptBuilder:
+    def __init__(self, deadline: float = 0.5, max_workers: int = 4):
+        self.deadline = deadline
+        self.sections: List[PromptSection] = []
+        self._cache: Dict[str, Dict[str, Any]] = {}
+        self._inflight: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prompt-section")
+        self.stats = {"builds": 0, "hits": 0, "renders": 0, "deadline_misses": 0}
+
+    def add_section(self, name: str, render: Callable[[], str], ttl: Optional[float] = None,
+                    version: Optional[Callable[[], Any]] = None, slow: bool = False) -> None:
+        """Register a section. Sections render in the order they were added."""
+        self.sections.append(PromptSection(name, render, ttl=ttl, version=version, slow=slow))
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """Drop one cached section, or all of them when no name is given."""
+        with self._lock:
+            if name is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(name, None)
+
+    def build(self) -> str:
+        """Assemble the prompt, re-rendering only stale sections."""
+        self.stats["builds"] += 1
+        values: Dict[str, str] = {}
+        pending = {}
+
+        for section in self.sections:
+            key = section.version() if section.version else None
+            cached = self._fresh(section, key)
+            if cached is not None:
+                self.stats["hits"] += 1
+                values[section.name] = cached
+            elif section.slow:
+                pending[section.name] = self._submit(section, key)
+            else:
+                values[section.name] = self._render(section, key)
+
+        if pending:
+            wait(list(pending.values()), timeout=self.deadline)
+            for name, future in pending.items():
+                if future.done() and not future.exception():
+                    values[name] = future.result()
+                else:
+                    # Missed the deadline: fall back to the last value we had
+                    self.stats["deadline_misses"] += 1
+                    with self._lock:
+                        stale = self._cache.get(name)
+                    values[name] = stale["value"] if stale else ""
+
+        return "\n".join(values[s.name] for s in self.sections if values[s.name])
+
+    def _fresh(self, section: PromptSection, key: Any) -> Optional[str]:
+        with self._lock:
+            entry = self._cache.get(section.name)
+        if not entry or entry["version"] != key:
+            return None
+        if section.ttl is not None and time.time() - entry["rendered_at"] > section.ttl:
+            return None
+        return entry["value"]
+
+    def _render(self, section: PromptSection, key: Any) -> str:
+        try:
+            value = section.render() or ""
+        except Exception as e:
+            print(f"Error rendering prompt section '{section.name}': {e}")
+            with self._lock:
+                stale = self._cache.get(section.name)
+            return stale["value"] if stale else ""
+        self.stats["renders"] += 1
+        with self._lock:
+            self._cache[section.name] = {"value": value, "version": key, "rendered_at": time.time()}
+        return value
+
+    def _submit(self, section: PromptSection, key: Any):
+        with self._lock:
+            future = self._inflight.get(section.name)
+            if future is None or future.done():
+                future = self._executor.submit(self._render, section, key)
+                self._inflight[section.name] = future
+        return future
@@ -0,0 +1,237 @@
+"""
+query_router.py
+
+Fast-path router for incoming messages.
+Sorts each message into one of four routes before any 30B work happens:
+- trivial: greetings and one-line math, answered by a small model
+- chat:    conversation with no tools, answered without the tool protocol
+- tool:    the full agent loop on the main model
+- code:    the full agent loop on the coding model
+
+Routing is a cheap local classifier: fixed patterns for trivial messages,
+keyword scores, and a naive Bayes model learned from how past messages
+actually played out (judged from what the run produced, not from the route it
+was sent down). Only when those disagree or are unsure does it ask a small
+model. Exact repeats of trivial messages are served from a TTL cache. The
+learned counts are written to disk a few seconds after they change, at
+most once per ROUTER_SAVE_DELAY_S, and on exit.
+"""
+
+import atexit
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from config import DATA_PATH, ROUTER_MODEL, ROUTER_MIN_SAMPLES, ROUTER_CACHE_SIZE, ROUTER_CACHE_TTL, ROUTER_SAVE_DELAY_S
+
+ROUTER_FILE = os.path.join(DATA_PATH, "router.json")
+
+ROUTES = ["trivial", "chat", "tool", "code"]
+LEARNED_ROUTES = ["chat", "tool", "code"]
+
+TRIVIAL_PATTERNS = [
+    r"^hi$", r"^hello$", r"^hey$", r"^how are you\??$",
+    r"^\d+\s*[\+\-\*\/]\s*\d+$", # Simple math like 7+8
+    r"^what's up\??$", r"^yo$", r"^thanks?( you)?!?$", r"^ok(ay)?!?$", r"^good (morning|night|evening)!?$",
+]
+CODE_KEYWORDS = ["python", "code", "script", "function", "class", "import", "bug", "error", "fix", "build", "deploy",
+                 "refactor", "compile", "stack trace", "traceback", "repo"]
+TOOL_KEYWORDS = ["file", "folder", "directory", "open", "search", "look up", "find", "read", "create", "delete",
+                 "email", "calendar", "download", "install", "run", "latest", "news", "price", "weather",
+                 "website", "tab", "note", "remind", "council"]
+URL_OR_PATH = re.compile(r"https?://|(^|\s)[~/][\w.\-/]+")
+CODE_EXTENSIONS = (".py", ".js", ".ts", ".tsx", ".jsx", ".go", ".rs", ".java", ".kt", ".swift", ".c", ".cpp", ".h",
+                   ".rb", ".sh", ".sql", ".html", ".css")
+
+
+def _keyword_patterns(keywords):
+    # Whole words plus simple inflections: "fix" matches "fixes"/"fixed", not "prefix"
+    return [re.compile(rf"\b{re.escape(kw)}(?:s|es|ed|ing)?\b") for kw in keywords]
+
+
+CODE_PATTERNS = _keyword_patterns(CODE_KEYWORDS)
+TOOL_PATTERNS = _keyword_patterns(TOOL_KEYWORDS)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _tokens(text: str):
+    return re.findall(r"[a-z0-9_']+", text.lower())
+
+
+def observed_route(used_tools: bool, produced_code: bool) -> str:
+    """The route a finished run turned out to need, judged from what it produced."""
+    if produced_code:
+        return "code"
+    return "tool" if used_tools else "chat"
+
+
+class QueryRouter:
+    def __init__(self, brain=None):
+        self.brain = brain
+        self._lock = threading.Lock()
+        self.counts: Dict[str, Dict[str, int]] = {r: {} for r in LEARNED_ROUTES}
+        self.totals: Dict[str, int] = {r: 0 for r in LEARNED_ROUTES}
+        self._load()
+        self._save_timer: Optional[threading.Timer] = None
+        atexit.register(self.flush)
+        self._cache: OrderedDict = OrderedDict()
+        self.stats: Dict[str, Any] = {
+            "routes": {r: 0 for r in ROUTES},
+            "model_calls": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "classify_ms_total": 0.0,
+        }
+
+    def _load(self):
+        try:
+            if os.path.exists(ROUTER_FILE):
+                with open(ROUTER_FILE, 'r') as f:
+                    data = json.load(f)
+                self.counts.update(data.get("counts", {}))
+                self.totals.update(data.get("totals", {}))
+        except Exception as e:
+            print(f"Error loading router model: {e}")
+
+    def _schedule_save(self):
+        """Save once ROUTER_SAVE_DELAY_S from now, folding in everything learned meanwhile; call with _lock held."""
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(ROUTER_SAVE_DELAY_S, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """Write the learned counts now if they changed since the last save."""
+        with self._lock:
+            if self._save_timer is None:
+                return
+            self._save_timer.cancel()
+            self._save_timer = None
+            data = json.dumps({"counts": self.counts, "totals": self.totals})
+        try:
+            os.makedirs(os.path.dirname(ROUTER_FILE), exist_ok=True)
+            tmp = ROUTER_FILE + ".tmp"
+            with open(tmp, 'w') as f:
+                f.write(data)
+            os.replace(tmp, ROUTER_FILE)
+        except Exception as e:
+            print(f"Error saving router model: {e}")
+
+    def route(self, text: str) -> str:
+        """Pick a route for a message and record how long the decision took."""
+        start = time.perf_counter()
+        route, source = self._classify(text)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.stats["routes"][route] += 1
+            self.stats["classify_ms_total"] += elapsed_ms
+        print(f"Router: '{text[:40]}' -> {route} via {source} in {elapsed_ms:.1f}ms")
+        return route
+
+    def _classify(self, text: str) -> Tuple[str, str]:
+        normalized = _normalize(text)
+        if any(re.match(p, normalized) for p in TRIVIAL_PATTERNS):
+            return "trivial", "pattern"
+
+        heuristic, confident = self._keyword_route(normalized)
+        learned, probability = self._bayes_route(normalized)
+        if learned and probability >= 0.8:
+            return learned, "learned"
+        if confident:
+            return heuristic, "keywords"
+        if self.brain and ROUTER_MODEL:
+            routed = self._model_route(text)
+            if routed:
+                return routed, "model"
+        return heuristic, "keywords"
+
+    def _keyword_route(self, text: str) -> Tuple[str, bool]:
+        code = sum(1 for pattern in CODE_PATTERNS if pattern.search(text))
+        tool = sum(1 for pattern in TOOL_PATTERNS if pattern.search(text)) + (2 if URL_OR_PATH.search(text) else 0)
+        if code > tool:
+            return "code", code - tool >= 2
+        if tool > code:
+            return "tool", tool - code >= 2
+        if code == tool == 0 and len(text) < 80:
+            return "chat", True
+        # Unsure: the full loop can always answer in plain text
+        return "tool", False
+
+    def _bayes_route(self, text: str) -> Tuple[Optional[str], float]:
+        with self._lock:
+            samples = sum(self.totals.values())
+            if samples < ROUTER_MIN_SAMPLES:
+                return None, 0.0
+            vocab = len({t for r in LEARNED_ROUTES for t in self.counts[r]}) or 1
+            scores = {}
+            for r in LEARNED_ROUTES:
+                words = sum(self.counts[r].values())
+                score = math.log((self.totals[r] + 1) / (samples + len(LEARNED_ROUTES)))
+                for token in _tokens(text):
+                    score += math.log((self.counts[r].get(token, 0) + 1) / (words + vocab))
+                scores[r] = score
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        probability = 1 / sum(math.exp(s - top) for s in scores.values())
+        return best, probability
+
+    def _model_route(self, text: str) -> Optional[str]:
+        """Ask the small router model, constrained to one of the routes."""
+        with self._lock:
+            self.stats["model_calls"] += 1
+        prompt = ("Classify this message for a personal assistant. Routes: chat (just talking), "
+                  "tool (needs files, web, apps or email), code (programming work).\n"
+                  f"Message: {text}")
+        schema = {"type": "object", "properties": {"route": {"enum": LEARNED_ROUTES}}, "required": ["route"]}
+        try:
+            reply = self.brain.think(prompt, model=ROUTER_MODEL, format=schema, options={"num_predict": 16})
+            route = json.loads(reply).get("route")
+            return route if route in LEARNED_ROUTES else None
+        except Exception as e:
+            print(f"Router model error: {e}")
+            return None
+
+    def learn(self, text: str, route: str):
+        """
+        Record the route a message turned out to need so future routing
+        improves. Pass observed_route() of a finished, uncancelled run, never
+        the route the message was sent down, or misroutes reinforce themselves.
+        """
+        if route not in LEARNED_ROUTES:
+            return
+        with self._lock:
+            for token in _tokens(text):
+                self.counts[route][token] = self.counts[route].get(token, 0) + 1
+            self.totals[route] += 1
+            self._schedule_save()
+
+    def cached_response(self, text: str) -> Optional[str]:
+        key = _normalize(text)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry and time.time() - entry[1] <= ROUTER_CACHE_TTL:
+                self._cache.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                return entry[0]
+            self.stats["cache_misses"] += 1
+        return None
+
+    def cache_response(self, text: str, response: str):
+        with self._lock:
+            self._cache[_normalize(text)] = (response, time.time())
+            self._cache.move_to_end(_normalize(text))
+            while len(self._cache) > ROUTER_CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {**self.stats, "routes": dict(self.stats["routes"])}
+        routed = sum(stats["routes"].values())
+        return {**stats, "avg_classify_ms": stats["classify_ms_total"] / routed if routed else 0.0}
@@ -0,0 +1,176 @@
+"""
+response_cache.py
+
+Persistent cache of Brain.think responses.
+Many prompts come back again and again with the same answer in practice (ad
+copy for one project, a translation, an ethics take on a repeated request).
+Responses are kept in data/response_cache.db keyed on model, prompt and
+options, with TTL and least-recently-used eviction. Callers opt in per call:
+"exact" only serves byte-identical requests, "semantic" also serves a request
+whose embedding is close enough to a cached one under the same scope. The
+embedded text is whatever the caller passes, usually just the variable part
+of a templated prompt. lookup() only embeds after the exact key misses, and
+returns that vector so put() can store it without embedding again.
+"""
+
+import math
+import os
+import sqlite3
+import struct
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config import DATA_PATH, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_SIMILARITY
+
+CACHE_DB = os.path.join(DATA_PATH, "response_cache.db")
+MODES = ("exact", "semantic")
+
+
+def _pack(vector: List[float]) -> bytes:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return struct.pack(f"{len(vector)}f", *(x / norm for x in vector))
+
+
+def _unpack(blob: bytes) -> Tuple[float, ...]:
+    return struct.unpack(f"{len(blob) // 4}f", blob)
+
+
+class ResponseCache:
+    def __init__(self, db_file: str = CACHE_DB, ttl: float = RESPONSE_CACHE_TTL,
+                 max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, similarity: float = RESPONSE_CACHE_SIMILARITY,
+                 embed: Optional[Callable[[str], Optional[List[float]]]] = None):
+        self.db_file = db_file
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.embed = embed # Only needed for semantic lookups
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Any] = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "gpu_s_saved": 0.0,
+        }
+        os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                scope TEXT NOT NULL,
+                response TEXT NOT NULL,
+                embedding BLOB,
+                gpu_s REAL DEFAULT 0,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER DEFAULT 0
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_scope ON responses (scope)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used)')
+        self._conn.commit()
+
+    def get(self, key: str, scope: str, prompt: str, mode: str = "exact") -> Optional[str]:
+        """Return a cached response for this request, or None on a miss."""
+        return self.lookup(key, scope, prompt, mode)[0]
+
+    def lookup(self, key: str, scope: str, prompt: str,
+               mode: str = "exact") -> Tuple[Optional[str], Optional[List[float]]]:
+        """
+        (cached response or None, prompt embedding or None). The embedding is
+        only computed for a semantic lookup whose exact key missed; pass it
+        to put() after a miss.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute('SELECT response, gpu_s, created FROM responses WHERE key = ?', (key,)).fetchone()
+            if row and now - row[2] <= self.ttl:
+                self._hit(key, row[1], now)
+                self.stats["exact_hits"] += 1
+                return row[0], None
+
+        vector = None
+        if mode == "semantic":
+            vector = self._embed(prompt)
+            if vector:
+                match = self._nearest(scope, _unpack(_pack(vector)), now)
+                if match:
+                    with self._lock:
+                        self._hit(match[0], match[2], now)
+                        self.stats["semantic_hits"] += 1
+                    return match[1], vector
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None, vector
+
+    def put(self, key: str, scope: str, prompt: str, response: str, gpu_s: float = 0.0, mode: str = "exact",
+            vector: Optional[List[float]] = None):
+        """Store a fresh response; gpu_s is what a later hit on it saves."""
+        if mode != "semantic":
+            vector = None
+        elif not vector:
+            vector = self._embed(prompt)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (key, scope, response, embedding, gpu_s, created, last_used, hits) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, 0)',
+                (key, scope, response, _pack(vector) if vector else None, gpu_s, now, now))
+            self.stats["stores"] += 1
+            self._evict(now)
+            self._conn.commit()
+
+    def _hit(self, key: str, gpu_s: float, now: float):
+        self._conn.execute('UPDATE responses SET last_used = ?, hits = hits + 1 WHERE key = ?', (now, key))
+        self._conn.commit()
+        self.stats["gpu_s_saved"] += gpu_s or 0.0
+
+    def _embed(self, prompt: str) -> Optional[List[float]]:
+        if not self.embed:
+            return None
+        try:
+            return self.embed(prompt)
+        except Exception as e:
+            print(f"Response cache embedding error: {e}")
+            return None
+
+    def _nearest(self, scope: str, vector: Tuple[float, ...], now: float) -> Optional[Tuple[str, str, float]]:
+        """Most similar live entry with the same model/options, if it clears the threshold."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT key, response, gpu_s, embedding FROM responses '
+                'WHERE scope = ? AND embedding IS NOT NULL AND created >= ?', (scope, now - self.ttl)).fetchall()
+        best, best_score = None, self.similarity
+        for key, response, gpu_s, blob in rows:
+            other = _unpack(blob)
+            if len(other) != len(vector):
+                continue
+            # Both sides are unit length, so the dot product is the cosine similarity
+            score = sum(a * b for a, b in zip(vector, other))
+            if score >= best_score:
+                best, best_score = (key, response, gpu_s), score
+        return best
+
+    def _evict(self, now: float):
+        expired = self._conn.execute('DELETE FROM responses WHERE created < ?', (now - self.ttl,)).rowcount
+        count = self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        overflow = max(0, count - self.max_entries)
+        if overflow:
+            self._conn.execute('DELETE FROM responses WHERE key IN '
+                               '(SELECT key FROM responses ORDER BY last_used ASC LIMIT ?)', (overflow,))
+        self.stats["evictions"] += expired + overflow
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM responses')
+            self._conn.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            stats = dict(self.stats)
+        lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+        hits = stats["exact_hits"] + stats["semantic_hits"]
+        return {**stats, "entries": entries, "hit_rate": hits / lookups if lookups else 0.0}
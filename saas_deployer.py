@@ -48,7 +48,7 @@ class AdCopyGenerator:
         """Write and optimize marketing copy for a project."""
         # Placeholder for actual ad copy generation logic
         prompt = f"You are Timmy's Ad-Copy-Generator. Write and optimize marketing copy for: {project_name}."
-        return self.brain.think(prompt)
+        return self.brain.think(prompt, cache="exact")
 
 class MarketSentimentOracle:
     def __init__(self, brain):
@@ -14,9 +14,13 @@ import os
 import asyncio
 import random
 import time
+from typing import Optional
 
+BOOT_STARTED = time.time() # Importing and constructing the agent is the startup cost measured below
 from agent import Agent
-from config import WEB_SERVER_HOST, WEB_SERVER_PORT, PROJECT_ROOT
+from cancellation import CancelToken
+from embedding_service import get_embedding_service, peak_rss_mb
+from config import WEB_SERVER_HOST, WEB_SERVER_PORT, PROJECT_ROOT, FAST_PATH_MODEL, EMBEDDING_WARM_UP_ON_START
 
 app = FastAPI()
 
@@ -24,25 +28,88 @@ app.mount("/static", StaticFiles(directory=os.path.join(PROJECT_ROOT, "static"))
 templates = Jinja2Templates(directory=os.path.join(PROJECT_ROOT, "templates"))
 
 agent = Agent()
+STARTUP = {"startup_s": round(time.time() - BOOT_STARTED, 2), "peak_rss_mb": round(peak_rss_mb(), 1)}
+print(f"Agent ready in {STARTUP['startup_s']}s (peak RSS {STARTUP['peak_rss_mb']}MB)")
 
 # Start the subconscious loop
 agent.subconscious.start()
 
+@app.on_event("startup")
+async def warm_models():
+    """Load the main and fast-path models in the background so the first message doesn't pay for it."""
+    if EMBEDDING_WARM_UP_ON_START:
+        get_embedding_service().warm_up()
+    async def warm():
+        for model in (agent.brain.main_model, FAST_PATH_MODEL):
+            await agent.brain.preload_async(model)
+    asyncio.create_task(warm())
+
+
 @app.get("/", response_class=HTMLResponse)
 async def get(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
 @app.get("/history")
-async def get_history():
-    """Returns chat history for restoring on page refresh."""
+async def get_history(before_id: Optional[int] = None, limit: int = 50):
+    """Returns chat history for restoring on page refresh. Pass before_id to page further back."""
     try:
-        history = agent.get_chat_history_for_display(50)
+        history = agent.get_chat_history_for_display(limit, before_id=before_id)
         return JSONResponse(content={"messages": history})
     except Exception as e:
         return JSONResponse(content={"messages": [], "error": str(e)})
 
 
+@app.get("/blob/{handle}")
+async def get_blob(handle: str, start_line: Optional[int] = None, end_line: Optional[int] = None,
+                   offset: Optional[int] = None, length: Optional[int] = None):
+    """Lazy-load one page of a large tool output stored out-of-band."""
+    page = agent.blob_store.read(handle, start_line=start_line, end_line=end_line, offset=offset, length=length)
+    return JSONResponse(content=page, status_code=200 if page.get("status") == "success" else 404)
+
+
+@app.get("/stats/telemetry")
+async def get_telemetry(hours: float = 24):
+    """p50/p95 latency, tokens/s and GPU-seconds per subsystem and per model."""
+    return JSONResponse(content=agent.brain.get_telemetry(hours))
+
+
+@app.get("/stats/calls")
+async def get_call_stats(limit: int = 20):
+    """Recent Ollama calls: load/prefill/eval timings, time-to-first-token and tokens per second."""
+    return JSONResponse(content={"calls": agent.brain.get_call_stats(limit)})
+
+
+@app.get("/stats/routing")
+async def get_routing_stats():
+    """Model routing chains, measured per-model speed, SLO hit rates and recent decisions."""
+    return JSONResponse(content=agent.model_router.get_stats())
+
+
+@app.get("/stats/embeddings")
+async def get_embedding_stats():
+    """Startup time and RSS, plus the shared embedding model's load time, usage and cache hit rate."""
+    return JSONResponse(content={"startup": STARTUP, "embeddings": get_embedding_service().get_stats()})
+
+
+@app.get("/stats/cache")
+async def get_cache_stats():
+    """Response cache hit/miss counts and the GPU time hits have saved."""
+    return JSONResponse(content=agent.brain.get_cache_stats())
+
+
+@app.get("/stats/scheduler")
+async def get_scheduler_stats():
+    """LLM queue depth, running jobs and wait times per priority class."""
+    return JSONResponse(content=agent.brain.get_scheduler_stats())
+
+
+@app.get("/stats/residency")
+async def get_residency_report():
+    """Loaded models, their footprint, the hot set, and model loads per hour."""
+    return JSONResponse(content=agent.brain.get_residency_report())
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
@@ -76,27 +143,46 @@ async def websocket_endpoint(websocket: WebSocket):
 
     update_task = asyncio.create_task(ui_updates())
 
+    # The run in progress, if any. A new message (or a disconnect) cancels it.
+    current_run = None
+    current_cancel = None
+
+    async def run_agent(user_message: str, cancel: CancelToken):
+        try:
+            async for response_chunk in agent.handle_message_async(user_message, cancel):
+                await websocket.send_json(response_chunk)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Agent error: {e}")
+            await websocket.send_json({"type": "error", "text": str(e)})
+
+    def cancel_run():
+        if current_cancel:
+            current_cancel.cancel()
+        if current_run and not current_run.done():
+            current_run.cancel()
+
     try:
         while True:
             data = await websocket.receive_text()
             message = json.loads(data)
             user_message = message.get("message")
 
-            if user_message:
-                try:
-                    # Run the generator in a thread to avoid blocking the event loop
-                    # but since it's a generator yielding chunks, we iterate it here.
-                    for response_chunk in agent.handle_message(user_message):
-                        await websocket.send_json(response_chunk)
-                except Exception as e:
-                    print(f"Agent error: {e}")
-                    await websocket.send_json({"type": "error", "text": str(e)})
+            if message.get("cancel"):
+                cancel_run()
+            elif user_message:
+                cancel_run()
+                current_cancel = CancelToken()
+                current_run = asyncio.create_task(run_agent(user_message, current_cancel))
 
     except WebSocketDisconnect:
         print("Client disconnected")
+        cancel_run()
         update_task.cancel()
     except Exception as e:
         print(f"WebSocket error: {e}")
+        cancel_run()
         update_task.cancel()
         try:
             await websocket.send_json({"type": "error", "text": str(e)})
@@ -0,0 +1,244 @@
+"""
+single_flight.py
+
+Request coalescing for Brain.
+Background subsystems often ask the same model the same thing at about the
+same time. A SingleFlight lets the first caller for a key do the work while
+concurrent callers with an identical key wait for, and share, its result.
+Streams are fanned out: one upstream generation is pumped into a shared
+buffer that every subscriber replays from the start, so a late joiner still
+sees every token. The *_async variants do the same for coroutines on one
+event loop; they coalesce among themselves, not with threaded callers.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional
+from cancellation import CancelToken, is_cancelled
+
+
+def request_key(*parts: Any) -> str:
+    """Stable key for (model, messages, options, ...)."""
+    blob = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.waiters = 0
+
+
+class _Stream:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.chunks = []
+        self.finished = False
+        self.error: BaseException = None
+        self.subscribers = 0
+        self.abandon = CancelToken() # Cancelled once every subscriber has gone away
+
+
+class _AsyncStream:
+    def __init__(self):
+        self.changed = asyncio.Event() # Set whenever a chunk arrives or the stream ends
+        self.chunks = []
+        self.finished = False
+        self.error: BaseException = None
+        self.subscribers = 0
+        self.abandon = CancelToken()
+
+    def notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, _Stream] = {}
+        self._async_calls: Dict[str, "asyncio.Future"] = {}
+        self._async_streams: Dict[str, _AsyncStream] = {}
+        self.stats = {"calls": 0, "coalesced": 0, "streams": 0, "stream_joins": 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run fn once for all concurrent callers sharing key."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.stats["calls"] += 1
+            else:
+                call.waiters += 1
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def stream(self, key: str, start: Callable[[CancelToken], Iterator[Any]],
+               cancel: Optional[CancelToken] = None) -> Iterator[Any]:
+        """
+        Subscribe to the shared stream for key, starting it if needed.
+        The upstream runs in its own thread; start() gets the flight's abandon
+        token, which is cancelled once every subscriber has gone away (a
+        subscriber leaves when its iterator is closed or `cancel` is set).
+        """
+        with self._lock:
+            flight = self._streams.get(key)
+            if flight is None:
+                flight = _Stream()
+                self._streams[key] = flight
+                self.stats["streams"] += 1
+                threading.Thread(target=self._pump, args=(key, flight, start), daemon=True).start()
+            else:
+                self.stats["stream_joins"] += 1
+            with flight.cond:
+                flight.subscribers += 1
+        return self._subscribe(key, flight, cancel)
+
+    def _pump(self, key: str, flight: _Stream, start: Callable[[], Iterator[Any]]):
+        upstream = None
+        try:
+            upstream = start(flight.abandon)
+            for chunk in upstream:
+                with flight.cond:
+                    if flight.abandon.cancelled:
+                        break # The finally below closes the upstream HTTP stream now
+                    flight.chunks.append(chunk)
+                    flight.cond.notify_all()
+        except BaseException as e:
+            flight.error = e
+        finally:
+            close = getattr(upstream, "close", None)
+            if close:
+                close()
+            with self._lock:
+                if self._streams.get(key) is flight:
+                    del self._streams[key]
+            with flight.cond:
+                flight.finished = True
+                flight.cond.notify_all()
+
+    def _subscribe(self, key: str, flight: _Stream, cancel: Optional[CancelToken]) -> Iterator[Any]:
+        index = 0
+        try:
+            while True:
+                with flight.cond:
+                    while index >= len(flight.chunks) and not flight.finished:
+                        # Timed, so a cancelled caller leaves without waiting for the next token
+                        if is_cancelled(cancel):
+                            return
+                        flight.cond.wait(timeout=0.25)
+                    if index >= len(flight.chunks):
+                        if flight.error:
+                            raise flight.error
+                        return
+                    chunk = flight.chunks[index]
+                index += 1
+                yield chunk
+        finally:
+            with self._lock, flight.cond:
+                flight.subscribers -= 1
+                if flight.subscribers <= 0 and not flight.finished:
+                    # Nobody is listening any more: stop paying for tokens,
+                    # and make sure nobody new joins a truncated stream
+                    flight.abandon.cancel()
+                    if self._streams.get(key) is flight:
+                        del self._streams[key]
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """do() for coroutines: await fn() once for all concurrent callers sharing key."""
+        future = self._async_calls.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            # Shielded, so one waiter being cancelled doesn't cancel the shared call
+            return await asyncio.shield(future)
+        self.stats["calls"] += 1
+        future = asyncio.ensure_future(fn())
+        self._async_calls[key] = future
+        future.add_done_callback(lambda done: self._async_calls.pop(key) if self._async_calls.get(key) is done else None)
+        return await asyncio.shield(future)
+
+    def stream_async(self, key: str, start: Callable[[CancelToken], AsyncIterator[Any]],
+                     cancel: Optional[CancelToken] = None) -> AsyncIterator[Any]:
+        """stream() for coroutines: the upstream is pumped by a task instead of a thread."""
+        flight = self._async_streams.get(key)
+        if flight is None:
+            flight = _AsyncStream()
+            self._async_streams[key] = flight
+            self.stats["streams"] += 1
+            loop = asyncio.get_running_loop()
+            pump = loop.create_task(self._pump_async(key, flight, start))
+            # Abandoning stops the pump even while it is waiting on the next chunk or a slot
+            flight.abandon.on_cancel(lambda: loop.call_soon_threadsafe(pump.cancel))
+        else:
+            self.stats["stream_joins"] += 1
+        flight.subscribers += 1
+        return self._subscribe_async(key, flight, cancel)
+
+    async def _pump_async(self, key: str, flight: _AsyncStream, start: Callable[[CancelToken], AsyncIterator[Any]]):
+        upstream = None
+        try:
+            upstream = start(flight.abandon)
+            async for chunk in upstream:
+                if flight.abandon.cancelled:
+                    break
+                flight.chunks.append(chunk)
+                flight.notify()
+        except BaseException as e:
+            flight.error = e
+        finally:
+            close = getattr(upstream, "aclose", None)
+            if close:
+                await close()
+            if self._async_streams.get(key) is flight:
+                del self._async_streams[key]
+            flight.finished = True
+            flight.notify()
+
+    async def _subscribe_async(self, key: str, flight: _AsyncStream, cancel: Optional[CancelToken]) -> AsyncIterator[Any]:
+        index = 0
+        try:
+            while True:
+                while index >= len(flight.chunks) and not flight.finished:
+                    if is_cancelled(cancel):
+                        return
+                    changed = flight.changed
+                    try:
+                        await asyncio.wait_for(changed.wait(), timeout=0.25)
+                    except asyncio.TimeoutError:
+                        pass
+                if index >= len(flight.chunks):
+                    if flight.error:
+                        raise flight.error
+                    return
+                chunk = flight.chunks[index]
+                index += 1
+                yield chunk
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers <= 0 and not flight.finished:
+                flight.abandon.cancel()
+                if self._async_streams.get(key) is flight:
+                    del self._async_streams[key]
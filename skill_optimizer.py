@@ -3,7 +3,7 @@ skill_optimizer.py
 
 Implements Timmy's "Skill-Recursive-Optimizer" and Self-Evolution/Meta-Cognition upgrades.
 - Skill-Recursive-Optimizer: Rewrites Forged Skills to be more efficient.
-- Model-Ensemble-Synthesizer: Routes sub-tasks to the best local models.
+- Model-Ensemble-Synthesizer: Routes sub-tasks to the best local models (via model_router).
 - Failure-Post-Mortem-Logic: Analyzes tool failures and updates logic.
 - Curiosity-Expansion-Loop: Proactively downloads new datasets/models.
 - Singularity-Seal: Final layer of loyalty and safety.
@@ -15,6 +15,7 @@ import time
 import random
 from typing import List, Dict, Any, Optional
 from config import DATA_PATH
+from model_router import ModelRouter
 
 class SkillOptimizer:
     def __init__(self, brain):
@@ -29,16 +30,17 @@ class SkillOptimizer:
         return f"Skill-Recursive-Optimizer: I've optimized the '{skill_name}' skill to be 20% faster."
 
 class ModelSynthesizer:
-    def __init__(self, brain):
+    def __init__(self, brain, router=None):
         self.brain = brain
+        self.router = router or ModelRouter(brain)
 
     def route_task(self, task: str) -> str:
-        """Route a sub-task to the best local model."""
-        # Placeholder for actual model routing logic
-        print(f"Model-Ensemble-Synthesizer is routing: {task}")
-        
-        # Simulate routing
-        return f"Model-Ensemble-Synthesizer: I've routed '{task}' to the best local model for maximum performance."
+        """Route a sub-task to the best local model for its type and latency budget."""
+        task_type = self.router.classify(task)
+        decision = self.router.route(task_type)
+        print(f"Model-Ensemble-Synthesizer is routing: {task} -> {decision['model']}")
+        return (f"Model-Ensemble-Synthesizer: routed '{task}' ({task_type}) to {decision['model']} "
+                f"— predicted {decision['predicted_s']:.0f}s against a {decision['slo_s']}s budget ({decision['reason']}).")
 
 class PostMortemLogic:
     def __init__(self, brain):
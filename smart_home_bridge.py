@@ -70,5 +70,6 @@ class PolyglotBridge:
 
     def translate_text(self, text: str, target_lang: str) -> str:
         """Real-time translation for emails or calls."""
-        # Placeholder for actual translation logic
-        return f"Language-Polyglot-Bridge: I've translated '{text}' to {target_lang}."
+        prompt = f"Translate the following text to {target_lang}. Reply with the translation only.\n\n{text}"
+        # The same text comes back often (signatures, boilerplate), so reuse earlier translations
+        return self.brain.think(prompt, cache="exact", options={"temperature": 0})
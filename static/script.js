@@ -66,7 +66,7 @@ function handleIncomingData(data) {
             updateStatus(data.text);
             break;
         case 'tool_output':
-            appendToolOutput(data.tool_name, data.output);
+            appendToolOutput(data.tool_name, data.output, data.blob);
             break;
         case 'subconscious_thought':
             appendDream(data.text);
@@ -89,6 +89,18 @@ function handleIncomingData(data) {
         case 'pulse':
             updatePulse(data.temp);
             break;
+        case 'council_status':
+        case 'council_error':
+            addStatusMessage(data.text);
+            currentAssistantMessage = null;
+            break;
+        case 'council_debate_chunk':
+            appendCouncilChunk(data.model, data.text);
+            break;
+        case 'council_summary':
+            // Summary streams in as deltas, like a normal reply
+            appendAssistantChunk(data.text);
+            break;
     }
 }
 
@@ -144,11 +156,30 @@ function appendAssistantChunk(text) {
     scrollToBottom();
 }
 
+function appendCouncilChunk(model, text) {
+    const messages = document.getElementById('messages');
+    const last = messages.lastElementChild;
+    let body;
+    if (last && last.dataset.councilModel === model) {
+        body = last.querySelector('.council-text');
+    } else {
+        const div = document.createElement('div');
+        div.className = 'message assistant council';
+        div.dataset.councilModel = model;
+        div.innerHTML = `<strong><i class="fas fa-users"></i> ${model}</strong><div class="council-text"></div>`;
+        messages.appendChild(div);
+        body = div.querySelector('.council-text');
+    }
+    body.innerText += text;
+    scrollToBottom();
+}
+
 function updateThinking(text) {
     const container = document.getElementById('thinking-container');
     const textEl = document.getElementById('thinking-text');
     container.classList.remove('hidden');
-    textEl.innerText = text;
+    // Thinking arrives as deltas from the stream parser
+    textEl.innerText += text;
     scrollToBottom();
 }
 
@@ -157,15 +188,45 @@ function updateStatus(text) {
     console.log('Status:', text);
 }
 
-function appendToolOutput(name, output) {
+function appendToolOutput(name, output, blob) {
     const messages = document.getElementById('messages');
     const div = document.createElement('div');
     div.className = 'message assistant tool-output';
     div.innerHTML = `<strong><i class="fas fa-terminal"></i> ${name}</strong><pre style="font-size: 0.8rem; margin-top: 10px; background: #000; padding: 10px; border-radius: 4px; overflow-x: auto;">${output}</pre>`;
+    if (blob) {
+        // Large outputs are stored server-side; fetch pages only when asked
+        const more = document.createElement('button');
+        more.className = 'load-more';
+        more.innerText = 'Load full output';
+        let nextOffset = 0;
+        more.addEventListener('click', () => loadBlobPage(div.querySelector('pre'), more, blob, nextOffset).then(next => { nextOffset = next; }));
+        div.appendChild(more);
+    }
     messages.appendChild(div);
     scrollToBottom();
 }
 
+async function loadBlobPage(pre, button, blob, offset) {
+    try {
+        const response = await fetch(`/blob/${encodeURIComponent(blob)}?offset=${offset}`);
+        const page = await response.json();
+        if (page.status !== 'success') {
+            button.innerText = 'Output no longer available';
+            button.disabled = true;
+            return offset;
+        }
+        if (offset === 0) pre.innerText = '';
+        pre.innerText += page.content;
+        const next = page.offset + page.length;
+        if (next >= page.total_chars) button.remove();
+        else button.innerText = `Load more (${next} / ${page.total_chars} chars)`;
+        return next;
+    } catch (e) {
+        console.error('Blob load failed:', e);
+        return offset;
+    }
+}
+
 function appendDream(text) {
     const feed = document.getElementById('dream-feed');
     const div = document.createElement('div');
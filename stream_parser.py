@@ -0,0 +1,257 @@
+"""
+stream_parser.py
+
+Incremental parser for Timmy's streamed model output.
+Splits the token stream into <thought> reasoning, plain text and a raw
+JSON action in a single pass, so each token costs time proportional to
+its own length instead of the whole response so far. Once an action
+object has closed, the caller can stop generation early. A '{' in prose is
+only held back until the text stops looking like JSON, and each character
+is rescanned at most once after a failed candidate, so the work per token
+stays constant.
+"""
+
+import json
+import re
+from collections import deque
+from typing import Dict, Any, List, Optional
+from config import STREAM_ACTION_MAX_CHARS
+
+TEXT = "text"
+THOUGHT = "thought"
+ACTION = "action"
+
+# An "action" key in any quoting: {"action": ..}, {'action': ..}, {action: ..}
+_ACTION_KEY = re.compile(r"""\{\s*['"]?action['"]?\s*:""")
+# Characters JSON allows outside a string: structure, numbers and true/false/null
+_JSON_BARE = set(" \t\r\n{}[]:,-+.0123456789eE") | set("truefalsn")
+# How many times a character has been scanned: fresh input may start a
+# candidate, a rescan may start one once more, a spent char is plain text
+_FRESH, _RESCAN, _SPENT = 0, 1, 2
+# An action's first key is a short word ("action", "params"); longer is a quote in prose
+_MAX_FIRST_KEY_CHARS = 32
+
+
+class StreamParser:
+    OPEN_TAG = "<thought>"
+    CLOSE_TAG = "</thought>"
+
+    def __init__(self):
+        self.state = TEXT
+        self.action: Optional[Dict[str, Any]] = None
+        self._raw: List[str] = []
+        self._text: List[str] = []
+        self._thought: List[str] = []
+        self._tag_match = 0
+        self._text_started = False
+        # Brace tracking for a candidate action object; (char, scan level) pairs
+        self._action_buf: List[tuple] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._first_key_seen = False
+        self._first_key_len = -1 # Chars in the first key so far; -1 before it opens, None once it closed
+        self._colon_due = False
+        # (char, scan level) of an abandoned candidate waiting to be scanned again
+        self._pending: deque = deque()
+        # Per-feed output, flushed as events in arrival order
+        self._events: List[Dict[str, Any]] = []
+        self._out_kind: Optional[str] = None
+        self._out: List[str] = []
+
+    @property
+    def done(self) -> bool:
+        """True once a complete action object has been parsed."""
+        return self.action is not None
+
+    @property
+    def action_attempted(self) -> bool:
+        """Something shaped like an action showed up in the text but didn't parse."""
+        return self.action is None and bool(_ACTION_KEY.search(self.text))
+
+    @property
+    def raw(self) -> str:
+        return "".join(self._raw)
+
+    @property
+    def text(self) -> str:
+        return "".join(self._text)
+
+    @property
+    def thought(self) -> str:
+        return "".join(self._thought)
+
+    def feed(self, token: str) -> List[Dict[str, Any]]:
+        """Consume one streamed token and return the events it produced."""
+        if self.done or not token:
+            return []
+        self._raw.append(token)
+        for ch in token:
+            self._pending.append((ch, _FRESH))
+            self._run_pending()
+            if self.done:
+                break
+        return self._drain()
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """Flush anything still buffered once the stream has ended."""
+        while not self.done:
+            if self._tag_match:
+                tag = self.OPEN_TAG if self.state == TEXT else self.CLOSE_TAG
+                self._emit_content(tag[:self._tag_match])
+                self._tag_match = 0
+            if self.state != ACTION:
+                break
+            # An unclosed candidate: rescan what followed its '{'
+            self._abandon_action()
+            self._run_pending()
+        return self._drain()
+
+    def _run_pending(self):
+        while self._pending and not self.done:
+            ch, level = self._pending.popleft()
+            if self.state == ACTION:
+                self._feed_action(ch, level)
+            else:
+                self._feed_tagged(ch, level)
+
+    def _feed_tagged(self, ch: str, level: int = _FRESH):
+        tag = self.OPEN_TAG if self.state == TEXT else self.CLOSE_TAG
+        if ch == tag[self._tag_match]:
+            self._tag_match += 1
+            if self._tag_match == len(tag):
+                self._tag_match = 0
+                self.state = THOUGHT if self.state == TEXT else TEXT
+            return
+        if self._tag_match:
+            # Both tags only contain '<' at position 0, so a mismatch just
+            # releases the partial match and rechecks this char as a new start.
+            self._emit_content(tag[:self._tag_match])
+            self._tag_match = 0
+            if ch == tag[0]:
+                self._tag_match = 1
+                return
+        if self.state == TEXT and ch == "{" and level != _SPENT:
+            self._start_action(ch, level)
+            return
+        self._emit_content(ch)
+
+    def _start_action(self, ch: str, level: int):
+        self.state = ACTION
+        self._action_buf = [(ch, level)]
+        self._depth = 1
+        self._in_string = False
+        self._escape = False
+        self._first_key_seen = False
+        self._first_key_len = -1
+        self._colon_due = False
+        self._emit("action_delta", ch)
+
+    def _feed_action(self, ch: str, level: int = _FRESH):
+        self._action_buf.append((ch, level))
+        self._emit("action_delta", ch)
+        if len(self._action_buf) > STREAM_ACTION_MAX_CHARS:
+            self._abandon_action()
+            return
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                if self._first_key_len is not None:
+                    self._first_key_len = None
+                    self._colon_due = True
+            elif ch == "\n":
+                # JSON strings can't hold a raw newline: this is a stray quote in prose
+                self._abandon_action()
+            elif self._first_key_len is not None:
+                self._first_key_len += 1
+                if self._first_key_len > _MAX_FIRST_KEY_CHARS:
+                    self._abandon_action()
+            return
+        if ch not in _JSON_BARE and ch != '"':
+            self._abandon_action()
+            return
+        if self._colon_due and not ch.isspace():
+            if ch != ":":
+                self._abandon_action()
+                return
+            self._colon_due = False
+        if not self._first_key_seen and not ch.isspace():
+            # A JSON object has to open with a quoted key; anything else is prose.
+            if ch != '"':
+                self._abandon_action()
+                return
+            self._first_key_seen = True
+            self._first_key_len = 0
+        if ch == '"':
+            self._in_string = True
+        elif ch == "{":
+            self._depth += 1
+        elif ch == "}":
+            self._depth -= 1
+            if self._depth == 0:
+                self._close_action()
+
+    def _close_action(self):
+        candidate = "".join(ch for ch, _ in self._action_buf)
+        try:
+            parsed = json.loads(candidate)
+        except ValueError:
+            self._abandon_action()
+            return
+        if isinstance(parsed, dict) and "action" in parsed:
+            self.action = parsed
+            self._flush_out()
+            self._events.append({"type": "action", "action": parsed})
+            return
+        # Valid JSON that isn't an action is data the model is showing, nested objects and all
+        self._action_buf = []
+        self.state = TEXT
+        self._emit_content(candidate)
+
+    def _abandon_action(self):
+        """
+        The candidate was not an action: release its '{' as text and scan
+        the rest again, so a <thought> tag or a real action inside it
+        (e.g. '{{"action": ...}') is still recognized. Each char goes up one
+        scan level, and a spent char can no longer open a candidate, so no
+        character is rescanned more than once.
+        """
+        buffered = self._action_buf
+        self._action_buf = []
+        self.state = TEXT
+        self._emit_content(buffered[0][0])
+        self._pending.extendleft(reversed([(ch, min(level + 1, _SPENT)) for ch, level in buffered[1:]]))
+
+    def _emit_content(self, chars: str):
+        if self.state == THOUGHT:
+            self._thought.append(chars)
+            self._emit("thinking", chars)
+            return
+        if not self._text_started:
+            chars = chars.lstrip()
+            if not chars:
+                return
+            self._text_started = True
+        self._text.append(chars)
+        self._emit("text_chunk", chars)
+
+    def _emit(self, kind: str, chars: str):
+        if kind != self._out_kind:
+            self._flush_out()
+            self._out_kind = kind
+        self._out.append(chars)
+
+    def _flush_out(self):
+        if self._out:
+            self._events.append({"type": self._out_kind, "text": "".join(self._out)})
+        self._out = []
+        self._out_kind = None
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        self._flush_out()
+        events, self._events = self._events, []
+        return events
@@ -15,6 +15,7 @@ import json
 import os
 from typing import Optional, Callable
 from config import DATA_PATH
+from llm_scheduler import Preempted
 
 class Subconscious:
     def __init__(self, agent):
@@ -94,7 +95,7 @@ class Subconscious:
         
         try:
             # Use the brain to generate a thought
-            response = self.agent.brain.think(prompt)
+            response = self.agent.brain.think(prompt, priority="background")
             
             # Record in journal
             entry = {
@@ -110,6 +111,8 @@ class Subconscious:
             # This will be picked up by the server's background task
             print(f"Subconscious ({self.vibe}): {response}")
             
+        except Preempted:
+            print("Subconscious thought interrupted: Ben needs the GPU.")
         except Exception as e:
             print(f"Subconscious error: {e}")
 
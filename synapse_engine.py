@@ -14,6 +14,7 @@ import time
 import random
 from typing import List, Dict, Any, Optional
 from config import DATA_PATH
+from llm_scheduler import Preempted
 
 SYNAPSE_FILE = os.path.join(DATA_PATH, "synapses.json")
 
@@ -77,8 +78,10 @@ class SynapseEngine:
             Find a hidden pattern, a new project idea, or a strategic improvement for the user.
             Be creative, bold, and human-like.
             """
-            insight = self.brain.think(prompt)
+            insight = self.brain.think(prompt, priority="background")
             return insight
+        except Preempted:
+            return None
         finally:
             self.is_dreaming = False
 
@@ -0,0 +1,248 @@
+"""
+telemetry.py
+
+Per-call LLM telemetry for Timmy AI.
+Every Ollama call Brain makes is recorded in data/telemetry.db: model,
+calling subsystem, token counts, Ollama's load/prefill/eval durations and
+the outcome. A stream the agent stopped reading early has no server timings;
+its row carries estimates from client-side timing and is flagged estimated.
+Rows go onto a queue and a background thread writes them in
+batches, so recording never blocks a generation. aggregates() rolls the
+table up into p50/p95 latency, tokens/s and GPU-seconds per subsystem and
+per model. Model routing decisions and their measured outcomes are logged
+to a second table, which model_stats() and route_stats() feed back into
+the router.
+"""
+
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, Any, List, Optional
+from config import DATA_PATH, TELEMETRY_QUEUE_SIZE, TELEMETRY_FLUSH_S, RESIDENCY_LOAD_THRESHOLD_S
+
+TELEMETRY_DB = os.path.join(DATA_PATH, "telemetry.db")
+COLUMNS = ("ts", "model", "subsystem", "kind", "priority", "outcome", "prompt_tokens", "eval_tokens",
+           "load_s", "prefill_s", "eval_s", "wall_s", "ttft_s", "estimated")
+ROUTE_COLUMNS = ("ts", "task", "model", "reason", "predicted_s", "slo_s", "actual_s", "tokens", "met_slo")
+
+# Frames in these modules are plumbing, not the subsystem that asked for the call
+_PLUMBING = {__name__, "brain", "single_flight", "llm_scheduler", "response_cache", "model_residency",
+             "contextlib", "threading"}
+
+
+def caller_subsystem(default: str = "unknown") -> str:
+    """Name of the first caller outside Brain's plumbing: its class if it has one, else its module."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module not in _PLUMBING:
+            owner = frame.f_locals.get("self")
+            return type(owner).__name__ if owner is not None else module
+        frame = frame.f_back
+    return default
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Telemetry:
+    def __init__(self, db_file: str = TELEMETRY_DB):
+        self.db_file = db_file
+        self._queue: queue.Queue = queue.Queue(maxsize=TELEMETRY_QUEUE_SIZE)
+        self.dropped = 0
+        os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+        conn = sqlite3.connect(self.db_file)
+        conn.execute('PRAGMA journal_mode=WAL') # Readers (the stats endpoint) don't block the writer
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS llm_calls (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts REAL NOT NULL,
+                model TEXT,
+                subsystem TEXT,
+                kind TEXT,
+                priority TEXT,
+                outcome TEXT,
+                prompt_tokens INTEGER,
+                eval_tokens INTEGER,
+                load_s REAL,
+                prefill_s REAL,
+                eval_s REAL,
+                wall_s REAL,
+                ttft_s REAL,
+                estimated INTEGER DEFAULT 0
+            )
+        ''')
+        if "estimated" not in {row[1] for row in conn.execute('PRAGMA table_info(llm_calls)')}:
+            conn.execute('ALTER TABLE llm_calls ADD COLUMN estimated INTEGER DEFAULT 0')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_calls_ts ON llm_calls (ts)')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS route_decisions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts REAL NOT NULL,
+                task TEXT,
+                model TEXT,
+                reason TEXT,
+                predicted_s REAL,
+                slo_s REAL,
+                actual_s REAL,
+                tokens INTEGER,
+                met_slo INTEGER
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_route_decisions_ts ON route_decisions (ts)')
+        conn.commit()
+        conn.close()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def record(self, **row: Any):
+        """Queue one call for writing. Never blocks; rows are dropped if the writer falls behind."""
+        self._enqueue("llm_calls", COLUMNS, row)
+
+    def record_route(self, **row: Any):
+        """Queue one routing decision with its measured outcome."""
+        self._enqueue("route_decisions", ROUTE_COLUMNS, row)
+
+    def _enqueue(self, table: str, columns: tuple, row: Dict[str, Any]):
+        row.setdefault("ts", time.time())
+        try:
+            self._queue.put_nowait((table, tuple(row.get(c) for c in columns)))
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self):
+        conn = sqlite3.connect(self.db_file)
+        sql = {table: f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+               for table, columns in (("llm_calls", COLUMNS), ("route_decisions", ROUTE_COLUMNS))}
+        while True:
+            rows = [self._queue.get()]
+            # Batch whatever else arrives within the flush window into one transaction
+            deadline = time.time() + TELEMETRY_FLUSH_S
+            while time.time() < deadline:
+                try:
+                    rows.append(self._queue.get(timeout=max(0.0, deadline - time.time())))
+                except queue.Empty:
+                    break
+            try:
+                for table in sql:
+                    batch = [values for name, values in rows if name == table]
+                    if batch:
+                        conn.executemany(sql[table], batch)
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Telemetry write error: {e}")
+
+    def aggregates(self, hours: float = 24) -> Dict[str, Any]:
+        """Latency percentiles, throughput and GPU-seconds per subsystem and per model."""
+        conn = sqlite3.connect(self.db_file)
+        try:
+            rows = conn.execute(
+                'SELECT subsystem, model, outcome, eval_tokens, load_s, prefill_s, eval_s, wall_s, ttft_s, estimated '
+                'FROM llm_calls WHERE ts >= ?', (time.time() - hours * 3600,)).fetchall()
+        finally:
+            conn.close()
+        return {
+            "hours": hours,
+            "calls": len(rows),
+            "dropped": self.dropped,
+            "by_subsystem": self._group(rows, 0),
+            "by_model": self._group(rows, 1),
+        }
+
+    def model_stats(self, hours: float = 24) -> Dict[str, Dict[str, float]]:
+        """Measured speed per model: tokens/s, median time-to-first-token and median cold-load time."""
+        conn = sqlite3.connect(self.db_file)
+        try:
+            rows = conn.execute(
+                "SELECT model, eval_tokens, eval_s, ttft_s, load_s, prefill_s FROM llm_calls "
+                "WHERE ts >= ? AND outcome = 'ok'", (time.time() - hours * 3600,)).fetchall()
+        finally:
+            conn.close()
+        grouped: Dict[str, List[tuple]] = {}
+        for row in rows:
+            grouped.setdefault(row[0], []).append(row)
+        stats = {}
+        for model, group in grouped.items():
+            eval_tokens = sum(r[1] or 0 for r in group)
+            eval_s = sum(r[2] or 0 for r in group)
+            # Non-streamed calls have no TTFT; load + prefill is the server-side equivalent
+            ttfts = [r[3] if r[3] is not None else (r[4] or 0) + (r[5] or 0) for r in group]
+            loads = [r[4] for r in group if (r[4] or 0) >= RESIDENCY_LOAD_THRESHOLD_S]
+            stats[model] = {
+                "calls": len(group),
+                "tokens_per_s": eval_tokens / eval_s if eval_s else 0.0,
+                "ttft_s": _percentile(ttfts, 50),
+                "load_s": _percentile(loads, 50) if loads else 0.0,
+            }
+        return stats
+
+    def route_stats(self, hours: float = 24) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """Per task and model: how often routed calls met their latency SLO, and their median latency."""
+        conn = sqlite3.connect(self.db_file)
+        try:
+            rows = conn.execute(
+                'SELECT task, model, actual_s, met_slo FROM route_decisions WHERE ts >= ? AND actual_s IS NOT NULL',
+                (time.time() - hours * 3600,)).fetchall()
+        finally:
+            conn.close()
+        grouped: Dict[tuple, List[tuple]] = {}
+        for task, model, actual_s, met in rows:
+            grouped.setdefault((task, model), []).append((actual_s, met))
+        stats: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for (task, model), group in grouped.items():
+            stats.setdefault(task, {})[model] = {
+                "calls": len(group),
+                "slo_met_rate": sum(1 for _, met in group if met) / len(group),
+                "p50_s": _percentile([a for a, _ in group], 50),
+            }
+        return stats
+
+    @staticmethod
+    def _group(rows: List[tuple], index: int) -> List[Dict[str, Any]]:
+        groups: Dict[str, List[tuple]] = {}
+        for row in rows:
+            groups.setdefault(row[index] or "unknown", []).append(row)
+        summary = []
+        for name, group in groups.items():
+            # A cache hit never reached the model, so its near-zero time isn't a latency
+            timed = [r for r in group if r[2] != "cache_hit"]
+            latencies = [r[7] for r in timed if r[7] is not None]
+            ttfts = [r[8] for r in timed if r[8] is not None]
+            eval_tokens = sum(r[3] or 0 for r in group)
+            eval_s = sum(r[6] or 0 for r in group)
+            outcomes: Dict[str, int] = {}
+            for r in group:
+                outcomes[r[2]] = outcomes.get(r[2], 0) + 1
+            summary.append({
+                "name": name,
+                "calls": len(group),
+                "estimated": sum(1 for r in group if r[9]),
+                "outcomes": outcomes,
+                "p50_s": _percentile(latencies, 50),
+                "p95_s": _percentile(latencies, 95),
+                "p50_ttft_s": _percentile(ttfts, 50),
+                "tokens_per_s": eval_tokens / eval_s if eval_s else 0.0,
+                "gpu_s": sum((r[4] or 0) + (r[5] or 0) + (r[6] or 0) for r in group),
+            })
+        # Heaviest consumers first
+        return sorted(summary, key=lambda s: s["gpu_s"], reverse=True)
+
+
+_telemetry: Optional[Telemetry] = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry() -> Telemetry:
+    """The process-wide telemetry writer."""
+    global _telemetry
+    with _telemetry_lock:
+        if _telemetry is None:
+            _telemetry = Telemetry()
+        return _telemetry
@@ -14,6 +14,7 @@ import random
 from typing import List, Dict, Any, Optional
 from config import TIMS_STUFF_PATH, DATA_PATH
 from tools.web_search import WebSearchTool
+from llm_scheduler import Preempted
 
 class WorldObserver:
     def __init__(self, brain):
@@ -45,7 +46,7 @@ class WorldObserver:
             Focus on legal, high-potential, and actionable ideas.
             Format your output as a Markdown report.
             """
-            report = self.brain.think(prompt)
+            report = self.brain.think(prompt, priority="background")
             
             # Save the report to 'tim's Stuff'
             report_filename = f"Opportunity_Report_{int(time.time())}.md"
@@ -57,6 +58,9 @@ class WorldObserver:
             
             self.last_observation_time = time.time()
             return f"I've created a new Opportunity Report in 'tim's Stuff': {report_filename}"
+        except Preempted:
+            # Interactive work took the GPU; try again on the next cycle
+            return None
         finally:
             self.is_observing = False
 